@@ -9,41 +9,71 @@ import time
 import creds
 
 import asyncio
+import bags
+import catering
+import cleanup
 import gspread
-import json
+import http_client
+import jobs
+import leaders
+import mirror
+import modals
+import names
+import notes
+import orderbook
 import os
+import profiles
 import re
-import requests
+import sheets
+import slack_api
+import team
+import templates
 import string
 
+from aiohttp import web
 from datetime import datetime, date, timedelta
-from fuzzywuzzy import fuzz, process
 from loguru import logger
 from pytz import timezone
 from slack_bolt.async_app import AsyncApp
-from slack_sdk.web import WebClient
-from slack_bolt.error import BoltError
 from slack_sdk.errors import SlackApiError
 
 # I'm a big fan of loguru and its simplicity. Obviously, any logging tool could be substituted here.
 logger.add("app.log", rotation="1 week")
 
-# Create Slack app
-app = AsyncApp(token=creds.bot_token,
+# Create Slack app. All Web API calls go through the scheduling client (see slack_api.py), including the
+# client Bolt hands to every handler.
+client = slack_api.ScheduledWebClient(token=creds.bot_token)
+app = AsyncApp(client=client,
                signing_secret=creds.signing_secret)
-client = WebClient(token=creds.bot_token)
 
-# Connect to Google Sheets
-gc = gspread.service_account(filename=creds.gspread)
-staff_spreadsheet = gc.open_by_key(creds.staff_id)
+# Google Sheets access lives in sheets.py. Handlers get worksheets from sheets.worksheet() and run
+# gspread calls through sheets.call() so they don't block the event loop.
 
 # Constants
 CHANNEL_TESTING = "G01QADSDVDW"
 CHANNEL_BORROW = "C01BUADKHLK"
 CHANNEL_SEDGWICK = "C059TU4SYR2"
+# How often the Home tab views are checked for anything that changed
+HOME_REFRESH_SECONDS = 60
+# How long a Home tab section gets before its fallback is used
+HOME_SECTION_TIMEOUT = 5
+
+# Calculated columns on the Sales sheet, keyed by column number. {row} is replaced with the row being filled in.
+SALES_FORMULAS = {
+    8: "=(F{row}-G{row})/E{row}",
+    9: "=F{row}*J{row}",
+    12: "=I{row}/K{row}",
+    13: "=F{row}/K{row}"
+}
 
 # Global variables
 order_info = {}
+tms_bags = bags.BagInventory(creds.tms_id)
+cater_orders = catering.CateringOrders(creds.cater_id)
+staff_index = names.NameIndex()
+leader_directory = leaders.LeaderDirectory()
+# Slack user ID -> (what the view was built from, Home tab view). Kept up to date by home_view_loop.
+home_views = {}
 
 
 # look for whitespace in string
@@ -63,6 +93,19 @@ def next_monday():
     return now + timedelta(days_ahead)
 
 
+async def staff_names():
+    """Team Member names from the CFA Staff sheet (column A). These come from the reference cache, so this is
+    cheap to call on every command."""
+    values = await sheets.get_values(creds.staff_id, "Staff")
+    return [row[0] for row in values if row and row[0]]
+
+
+async def match_staff(tm_name, limit=5):
+    """The closest Team Member names to tm_name as (name, score) pairs, best first"""
+    staff_index.update(await staff_names())
+    return staff_index.best(tm_name, limit)
+
+
 # It's poor design to hard code your help command since it won't update itself when you add/change commands,
 # but here it is.  I told you I wasn't a pro!  haha
 @app.command("/help")
@@ -131,8 +174,6 @@ async def handle_order_view(ack, body, client, view):
     provide in the form and processes it."""
     global order_info
     logger.info("Processing order input...")
-    user = await client.users_info(user=body['user']['id'])
-    user_name = user['user']['real_name'].split(" ", 1)[0].title()
     food_item = view['state']['values']['input_food_item']['food_item']['value']
     await ack()
     blocks = [
@@ -174,6 +215,7 @@ async def handle_order_view(ack, body, client, view):
                 }
             ]
         }
+    ]
     try:
         await client.chat_update(channel=order_info['channel_id'],
                                  ts=order_info['message_ts'],
@@ -194,26 +236,19 @@ async def loomis(ack, body, say):
 
 async def pull_cater(user_first):
     # Look for and add catering deliveries if they exist
-    spreadsheet = gc.open_by_key(creds.cater_id)
-    cater_sheet = spreadsheet.worksheet("Sheet1")
-    now_str = datetime.today().strftime("%m/%d/%Y")
-    list_of_orders = cater_sheet.findall(now_str, in_column=1)
+    orders = await cater_orders.orders()
     my_orders = []
     temp_blocks = []
-    if list_of_orders:
-        list_of_rows = [x.row for x in list_of_orders]
-        for row in list_of_rows:
-            row_values = cater_sheet.row_values(row)
-            if row_values[2] == user_first:
-                my_orders.append(
-                    {
-                        "type": "section",
-                        "text": {
-                            "type": "mrkdwn",
-                            "text": f"{row_values[1]} ⏱️ {row_values[3]} 📞 {row_values[5]}"
-                        }
-                    }
-                )
+    for _, row_values in orders.for_driver(user_first, date.today()):
+        my_orders.append(
+            {
+                "type": "section",
+                "text": {
+                    "type": "mrkdwn",
+                    "text": f"{row_values[1]} ⏱️ {row_values[3]} 📞 {row_values[5]}"
+                }
+            }
+        )
     if my_orders:
         temp_blocks.append(
             {
@@ -230,109 +265,6 @@ async def pull_cater(user_first):
     return temp_blocks
 
 
-async def pull_notes(user_loc):
-    notes_sheet = staff_spreadsheet.worksheet("Shift Notes")
-    all_values = notes_sheet.get_all_values()
-    leader_text = "Leadership Notes"
-    all_text = "All Store Notes"
-    area_text = f"{user_loc} Notes"
-    leader_elements = []
-    all_elements = []
-    area_elements = []
-    temp_blocks = []
-    for row in all_values:
-        if row[0] == leader_text:
-            value = row[1]
-            leader_elements.append(
-                {
-                    "type": "rich_text_section",
-                    "elements": [{"type": "text", "text": value}]
-                }
-            )
-        if row[0] == all_text:
-            value = row[1]
-            all_elements.append(
-                {
-                    "type": "rich_text_section",
-                    "elements": [{"type": "text", "text": value}]
-                }
-            )
-        if row[0] == area_text:
-            value = row[1]
-            area_elements.append(
-                {
-                    "type": "rich_text_section",
-                    "elements": [{"type": "text", "text": value}]
-                }
-            )
-    temp_blocks.append(
-        {
-            "type": "rich_text",
-            "elements": [
-                {
-                    "type": "rich_text_section",
-                    "elements": [
-                        {
-                            "type": "text",
-                            "text": "Leadership Notes\n"
-                        }
-                    ]
-                },
-                {
-                    "type": "rich_text_list",
-                    "style": "bullet",
-                    "elements": leader_elements
-                }
-            ]
-        }
-    )
-    temp_blocks.append({"type": "divider"})
-    temp_blocks.append(
-        {
-            "type": "rich_text",
-            "elements": [
-                {
-                    "type": "rich_text_section",
-                    "elements": [
-                        {
-                            "type": "text",
-                            "text": "All Store Notes\n"
-                        }
-                    ]
-                },
-                {
-                    "type": "rich_text_list",
-                    "style": "bullet",
-                    "elements": all_elements
-                }
-            ]
-        }
-    )
-    temp_blocks.append({"type": "divider"})
-    temp_blocks.append(
-        {
-            "type": "rich_text",
-            "elements": [
-                {
-                    "type": "rich_text_section",
-                    "elements": [
-                        {
-                            "type": "text",
-                            "text": f"{user_loc} Notes\n"
-                        }
-                    ]
-                },
-                {
-                    "type": "rich_text_list",
-                    "style": "bullet",
-                    "elements": area_elements
-                }
-            ]
-        }
-    )
-    return temp_blocks
-
-
 # @app.event("url_verification")
 # async def verify(event):
 #     """Used only to verify new IP address at
@@ -373,22 +305,14 @@ async def log_message_delete(event):
         "text": "Message Deleted",
         "blocks": blocks
     }
-    r = requests.post(creds.webhook_test, json=payload)
+    r = await http_client.post(creds.webhook_test, json=payload)
     if r.status_code != 200:
         raise ValueError(f"Request to Slack returned an error {r.status_code}\n"
                          f"The response is: {r.text}")
 
 
-@app.event("app_home_opened")
-async def initiate_home_tab(client, event):
-    """Provide user specific content to the Cathy Home tab"""
-    # Establish link to Google Sheets
-    leader_sheet = staff_spreadsheet.worksheet("Leaders")
-    user_cell = leader_sheet.find(event['user'])
-    user_first = leader_sheet.cell(user_cell.row, 1).value
-    user_loc = leader_sheet.cell(user_cell.row, 5).value
-    # build blocks
-    blocks = [
+def greeting_section(user_first):
+    return [
         {
             "type": "section",
             "text": {
@@ -401,12 +325,10 @@ async def initiate_home_tab(client, event):
             "type": "divider"
         }
     ]
-    # Add catering deliveries for this user, if they exist
-    cater_blocks = await pull_cater(user_first)
-    if cater_blocks:
-        blocks = blocks + cater_blocks
-    # Add Shift Notes
-    blocks.append(
+
+
+def notes_section(shift_notes, user_loc):
+    return [
         {
             "type": "section",
             "text": {
@@ -423,17 +345,107 @@ async def initiate_home_tab(client, event):
                 "action_id": "swap_notes"
             }
         }
+    ] + shift_notes.blocks(user_loc)
+
+
+async def pull_notes(user_loc):
+    return notes_section(await notes.current(), user_loc)
+
+
+async def home_section(name, provider, fallback):
+    """Wait for one section of the Home tab, but not for long. Returns (blocks, True), or (fallback, False)
+    if the section failed or took longer than HOME_SECTION_TIMEOUT."""
+    try:
+        return await asyncio.wait_for(provider, HOME_SECTION_TIMEOUT), True
+    except Exception:
+        logger.exception(f"Home tab section {name} didn't come through, using its fallback.\n")
+        return fallback, False
+
+
+async def build_home_view(leader):
+    """Build the Home tab for a leader. The sections are fetched at the same time and a slow one is replaced
+    by its fallback. Returns (view, True if every section came through)."""
+    user_first = leader.first_name
+    user_loc = leader.location
+    sections = await asyncio.gather(
+        # Add catering deliveries for this user, if they exist
+        home_section("catering", pull_cater(user_first), []),
+        # Add Shift Notes (the last ones we parsed if the sheet is being slow)
+        home_section("shift notes", pull_notes(user_loc), notes_section(notes.latest(), user_loc))
+    )
+    blocks = greeting_section(user_first)
+    for section_blocks, _ in sections:
+        blocks = blocks + section_blocks
+    view = {
+        "type": "home",
+        "callback_id": "home_view",
+        # which area's notes are showing, for the Swap Notes button
+        "private_metadata": user_loc,
+        "blocks": blocks
+    }
+    return view, all(complete for _, complete in sections)
+
+
+async def update_home_views():
+    """Rebuild the Home tab of every leader whose Home tab would look different now (new shift notes, a
+    catering order for them, a new day...). Returns the number of views rebuilt."""
+    # Warm up everything the views are built from at once. A failure here shows up in the sections.
+    all_leaders, _, _ = await asyncio.gather(
+        leader_directory.all(),
+        home_section("shift notes", notes.current(), None),
+        home_section("catering", cater_orders.orders(), None)
     )
-    notes_blocks = await pull_notes(user_loc)
-    blocks = blocks + notes_blocks
+    changed = 0
+    for leader in all_leaders:
+        if not leader.slack_id:
+            continue
+        # everything that goes into the view
+        inputs = (tuple(leader.row), notes.latest(), cater_orders.version, date.today())
+        cached = home_views.get(leader.slack_id)
+        if cached and cached[0] == inputs:
+            continue
+        view, complete = await build_home_view(leader)
+        # A view built from fallbacks gets rebuilt on the next pass
+        home_views[leader.slack_id] = (inputs if complete else None, view)
+        changed += 1
+    return changed
+
+
+async def home_view_loop():
+    while True:
+        try:
+            changed = await update_home_views()
+            if changed:
+                logger.info(f"Rebuilt {changed} Home tab view(s)")
+        except Exception:
+            logger.exception("Rebuilding Home tab views failed. Serving the old ones.\n")
+        await asyncio.sleep(HOME_REFRESH_SECONDS)
+
+
+# These two events need to be subscribed to in the Slack app settings for the profile cache to stay current
+@app.event("user_change")
+async def update_profile(event):
+    profiles.update(event['user'])
+
+
+@app.event("team_join")
+async def add_profile(event):
+    profiles.update(event['user'])
+
+
+@app.event("app_home_opened")
+async def initiate_home_tab(client, event):
+    """Provide user specific content to the Cathy Home tab"""
+    # Views are built ahead of time by home_view_loop, so this is normally just the publish
+    if event['user'] not in home_views:
+        await update_home_views()
+    if event['user'] not in home_views:
+        # not on the Leaders sheet
+        return
     # Publish view to home tab
     await client.views_publish(
         user_id=event['user'],
-        view={
-            "type": "home",
-            "callback_id": "home_view",
-            "blocks": blocks
-        }
+        view=home_views[event['user']][1]
     )
 
 
@@ -441,53 +453,48 @@ async def initiate_home_tab(client, event):
 async def home_swap_notes(ack, body, client):
     """"Update the Home tab following a button click by the user"""
     await ack()
-    blocks = body['view']['blocks']
-    # update blocks
-    user_loc = body['view']['blocks'][-1]['elements'][0]['elements'][0]['text'][:3]
-    logger.info(user_loc)
-    if user_loc == "BOH":
-        # Swap to FOH
-        notes_blocks = await pull_notes("FOH")
-    else:
-        # Swap to BOH
-        notes_blocks = await pull_notes("BOH")
-    blocks = blocks[:-5] + notes_blocks
+    # The notes are already parsed and their blocks built, so this doesn't touch Google at all
+    user_loc = "FOH" if body['view'].get('private_metadata') == "BOH" else "BOH"
+    blocks = body['view']['blocks'][:-5] + notes.latest().blocks(user_loc)
     # Publish view to home tab
     await client.views_publish(
         user_id=body['user']['id'],
         view={
             "type": "home",
             "callback_id": "home_view",
+            "private_metadata": user_loc,
             "blocks": blocks
         }
     )
 
 
 # Remove all Slack messages from the channel you are in. I only use this in my test channel.
-# This is a dangerous command and the "if body['user_id'] not in" line below limits the use of this
-# command to top leadership only.
+# This is a dangerous command and the check below limits the use of this command to the admins named in creds
+# (see leaders.ADMIN_IDS).
 @app.command("/clear")
 async def clear_messages(ack, body, say, client):
     """Clear the specified number of messages in the channel that called the command"""
     await ack()
-    if body['user_id'] not in [creds.pj_user_id, creds.hc_user_id, creds.jc_user_id, creds.pr_user_id, creds.jg_user_id]:
+    if body['user_id'] not in leaders.ADMIN_IDS:
         return await say("I'm sorry. Only admins can clear messages.")
-    result = await client.conversations_history(channel=body['channel_id'], limit=int(body['text']))
-    channel_history = result['messages']
-    counter = 0
-    for message in channel_history:
-        # if counter % 20 == 0:
-        #     await asyncio.sleep(2)
-        try:
-            await client.chat_delete(channel=body['channel_id'],
-                                     ts=message['ts'],
-                                     token=creds.user_token)
-        except BoltError as e:
-            print(f"Bolt error: {e}")
-        except SlackApiError as e:
-            print(f"Error deleting message: {e}")
-            await asyncio.sleep(2)
-        counter += 1
+    channel_id = body['channel_id']
+    text = body['text'].strip()
+    resume = text == "resume"
+    if resume and not cleanup.unfinished(channel_id):
+        return await say("There isn't an unfinished clear in this channel.")
+    if not resume and not text.isdigit():
+        return await say("Usage: /clear [number of messages] or /clear resume")
+    # Progress goes to the person clearing in a DM so it doesn't get cleared itself
+    status = await client.chat_postMessage(channel=body['user_id'], text=f"Clearing messages in <#{channel_id}>...")
+
+    async def progress(deleted, done, count):
+        await client.chat_update(channel=status['channel'], ts=status['ts'],
+                                 text=f"Clearing messages in <#{channel_id}>: {done} of {count} done, {deleted} deleted.")
+
+    count = 0 if resume else int(text)
+    deleted = await cleanup.clear_channel(client, channel_id, count, creds.user_token, progress=progress, resume=resume)
+    await client.chat_update(channel=status['channel'], ts=status['ts'],
+                             text=f"Finished clearing <#{channel_id}>. {deleted} message(s) deleted.")
 
 
 @app.command("/tardy")
@@ -502,11 +509,7 @@ async def tardy(ack, body, client):
     await ack()
     tm_name = body['text']
     fuzzy_num = 70
-    # Collect TM names from Staff Sheet
-    sh = gc.open_by_key(creds.staff_id)
-    sheet = sh.worksheet("Staff")
-    data = sheet.col_values(1)
-    name_options = process.extractBests(tm_name, data, limit=5)
+    name_options = await match_staff(tm_name)
     if not name_options or name_options[0][1] < fuzzy_num:
         return await client.chat_postEphemeral(channel=body['channel_id'],
                                                user=body['user_id'],
@@ -638,13 +641,10 @@ async def tardy_action_4(ack, body, respond):
 
 async def process_tardy(tardy_name, tardy_type, user_id, user_name):
     try:
-        sh = gc.open_by_key(creds.pay_scale_id)
-        sheet = sh.worksheet("Tardy")
         now = date.strftime(date.today(), "%m/%d/%Y")
-        to_post = [tardy_name, now]
-        sheet.append_row(to_post, value_input_option='USER_ENTERED')
-    except gspread.exceptions.GSpreadException as e:
-        await client.chat_postMessage(channel=user_id, text=e)
+        to_post = [tardy_name, now, team.resolve(tardy_name)]
+        # Queued and appended in the background (see sheets.append_later)
+        await sheets.append_later(creds.pay_scale_id, "Tardy", to_post, value_input_option='USER_ENTERED')
     except Exception as e:
         await client.chat_postMessage(channel=user_id,
                                       text=f"There was an error while storing the message to the Google Sheet.\n{e}")
@@ -692,124 +692,7 @@ async def add_injury(ack, body, client):
     await ack()
     await client.views_open(
         trigger_id=body['trigger_id'],
-        view={
-            "type": "modal",
-            "callback_id": "add_injury_view",
-            "title": {"type": "plain_text", "text": "Add Sedgwick Claim"},
-            "submit": {"type": "plain_text", "text": "Submit"},
-            "blocks": [
-                {
-                    "type": "input",
-                    "block_id": "input_a",
-                    "label": {"type": "plain_text", "text": "Select date of incident:"},
-                    "element": {
-                        "type": "datepicker",
-                        "action_id": "incident_date",
-                        "initial_date": str(date.today()),
-                        "placeholder": {
-                            "type": "plain_text",
-                            "text": "Date of incident",
-                            "emoji": True
-                        }
-                    }
-                },
-                {
-                    "type": "input",
-                    "block_id": "input_aa",
-                    "label": {"type": "plain_text", "text": "Select time of incident:"},
-                    "element": {
-                        "type": "timepicker",
-                        "action_id": "incident_time",
-                        "initial_time": "12:00",
-                        "placeholder": {
-                            "type": "plain_text",
-                            "text": "Time of incident",
-                            "emoji": True
-                        }
-                    }
-                },
-                {
-                    "type": "input",
-                    "block_id": "input_b",
-                    "label": {"type": "plain_text", "text": "Location:"},
-                    "element": {
-                        "type": "plain_text_input",
-                        "action_id": "location",
-                        "multiline": False
-                    },
-                    "optional": False
-                },
-                {
-                    "type": "divider"
-                },
-                {
-                    "type": "input",
-                    "block_id": "input_c",
-                    "label": {"type": "plain_text", "text": "Director completing the report:"},
-                    "element": {
-                        "type": "plain_text_input",
-                        "action_id": "director",
-                        "multiline": False
-                    },
-                    "optional": False
-                },
-                {
-                    "type": "input",
-                    "block_id": "input_d",
-                    "label": {"type": "plain_text", "text": "Employee (full name):"},
-                    "element": {
-                        "type": "plain_text_input",
-                        "action_id": "employee",
-                        "multiline": False
-                    },
-                    "optional": False
-                },
-                {
-                    "type": "input",
-                    "block_id": "input_e",
-                    "label": {"type": "plain_text", "text": "Employee Date of Birth:"},
-                    "element": {
-                        "type": "plain_text_input",
-                        "action_id": "date_of_birth",
-                        "multiline": False
-                    },
-                    "optional": False
-                },
-                {
-                    "type": "input",
-                    "block_id": "input_f",
-                    "label": {"type": "plain_text", "text": "Sedgwick Claim Number:"},
-                    "element": {
-                        "type": "plain_text_input",
-                        "action_id": "claim_num",
-                        "multiline": False
-                    },
-                    "optional": False
-                },
-                {
-                    "type": "input",
-                    "block_id": "input_g",
-                    "label": {"type": "plain_text", "text": ("Description of Incident (please note if any "
-                                                             "physical evidence or video was captured):")},
-                    "element": {
-                        "type": "plain_text_input",
-                        "action_id": "description",
-                        "multiline": True
-                    },
-                    "optional": False
-                },
-                {
-                    "type": "context",
-                    "block_id": "context_a",
-                    "elements": [
-                        {
-                            "type": "plain_text",
-                            "text": body['channel_id']
-                        }
-                    ]
-                }
-            ]
-        }
+        view=modals.INJURY.render(today=str(date.today()), channel_id=body['channel_id'])
     )
 
 
@@ -859,7 +742,6 @@ async def cater(ack, command, body, client):
     /cater delete
     """
     await ack()
-    cater_sheet = gc.open_by_key(creds.cater_id)
     trigger_id = body['trigger_id']
     if "text" in command:
         cmd = command['text']
@@ -867,111 +749,24 @@ async def cater(ack, command, body, client):
         cmd = "add"
     if cmd in ("remove", "delete"):
         # We are removing a catering order from the sheet
-        orders_sheet = cater_sheet.worksheet("Sheet1")
-        list_of_rows = orders_sheet.get_values("A2:F")
         order_options = []
-        now = datetime.today()
-        counter = 2
-        for row in list_of_rows:
-            if datetime.strptime(row[0], "%m/%d/%Y") >= now:
-                order_options.append(
-                    {
-                        "text": {"type": "plain_text", "text": f"{row[3]} ({row[0]} at {row[1]})"},
-                        "value": str(counter)
-                    }
-                )
-            counter += 1
+        for row_num, row in await cater_orders.upcoming():
+            order_options.append(
+                {
+                    "text": {"type": "plain_text", "text": f"{row[3]} ({row[0]} at {row[1]})"},
+                    # checked before deleting, in case the order moved while the modal was open
+                    "value": f"{row_num}:{orderbook.fingerprint(row)}"
+                }
+            )
         await client.views_open(
             trigger_id=trigger_id,
-            view={
-                "type": "modal",
-                "callback_id": "cater_remove_view",
-                "title": {"type": "plain_text", "text": "Remove Catering Order"},
-                "submit": {"type": "plain_text", "text": "Delete"},
-                "blocks": [
-                    {
-                        "type": "input",
-                        "block_id": "block_order",
-                        "label": {"type": "plain_text", "text": "Order to remove:"},
-                        "element": {
-                            "type": "static_select",
-                            "placeholder": {"type": "plain_text", "text": "Select an order"},
-                            "options": order_options,
-                            "action_id": "input_order"
-                        }
-                    },
-                    {
-                        "type": "context",
-                        "block_id": "block_channel",
-                        "elements": [
-                            {
-                                "type": "plain_text",
-                                "text": body['channel_id']
-                            }
-                        ]
-                    }
-                ]
-            }
+            view=modals.CATER_REMOVE.render(orders=order_options, channel_id=body['channel_id'])
         )
     else:
         # We are adding a new catering order
         await client.views_open(
             trigger_id=trigger_id,
-            view={
-                "type": "modal",
-                "callback_id": "cater_add_view",
-                "title": {"type": "plain_text", "text": "Add Catering Order"},
-                "submit": {"type": "plain_text", "text": "Add"},
-                "blocks": [
-                    {
-                        "type": "input",
-                        "block_id": "block_date",
-                        "label": {"type": "plain_text", "text": "Date:"},
-                        "element": {
-                            "type": "datepicker",
-                            "action_id": "input_date",
-                            "initial_date": str(date.today()),
-                            "placeholder": {
-                                "type": "plain_text",
-                                "text": "Select date..."
-                            }
-                        }
-                    },
-                    {
-                        "type": "input",
-                        "block_id": "block_time",
-                        "label": {"type": "plain_text", "text": "Time:"},
-                        "element": {
-                            "type": "timepicker",
-                            "action_id": "input_time",
-                            "initial_time": "11:15",
-                            "placeholder": {
-                                "type": "plain_text",
-                                "text": "Select time..."
-                            }
-                        }
-                    },
-                    {
-                        "type": "section",
-                        "block_id": "block_type",
-                        "text": {"type": "plain_text", "text": "Order Type:"},
-                        "accessory": {
-                            "type": "radio_buttons",
-                            "options": [
-                                {
-                                    "text": {"type": "plain_text", "text": "Pickup"},
-                                    "value": "pickup"
-                                },
-                                {
-                                    "text": {"type": "plain_text", "text": "Delivery"},
-                                    "value": "delivery"
-                                }
-                            ],
-                            "action_id": "input_type"
-                        }
-                    }
-                ]
-            }
+            view=modals.CATER_ADD.render(today=str(date.today()))
         )
 
 
@@ -981,120 +776,17 @@ async def update_modal(ack, body, client):
     cater_time = body['view']['state']['values']['block_time']['input_time']['selected_time']
     cater_type = body['view']['state']['values']['block_type']['input_type']['selected_option']
     await ack()
-    blocks = [
-        {
-            "type": "input",
-            "block_id": "block_date",
-            "label": {"type": "plain_text", "text": "Date:"},
-            "element": {
-                "type": "datepicker",
-                "action_id": "input_date",
-                "initial_date": cater_date,
-            }
-        },
-        {
-            "type": "input",
-            "block_id": "block_time",
-            "label": {"type": "plain_text", "text": "Time:"},
-            "element": {
-                "type": "timepicker",
-                "action_id": "input_time",
-                "initial_time": cater_time,
-            }
-        },
-        {
-            "type": "section",
-            "block_id": "block_type",
-            "text": {"type": "plain_text", "text": "Order Type:"},
-            "accessory": {
-                "type": "radio_buttons",
-                "initial_option": cater_type,
-                "options": [
-                    {
-                        "text": {"type": "plain_text", "text": "Pickup"},
-                        "value": "pickup"
-                    },
-                    {
-                        "text": {"type": "plain_text", "text": "Delivery"},
-                        "value": "delivery"
-                    }
-                ],
-                "action_id": "input_type"
-            }
-        }
-    ]
     if cater_type['value'] == "pickup":
-        blocks.extend(
-            [
-                {
-                    "type": "input",
-                    "block_id": "block_customer",
-                    "element": {"type": "plain_text_input", "action_id": "input_customer"},
-                    "label": {"type": "plain_text", "text": "Customer Name"}
-                },
-                {
-                    "type": "input",
-                    "block_id": "block_phone",
-                    "element": {"type": "plain_text_input", "action_id": "input_phone"},
-                    "label": {"type": "plain_text", "text": "Phone Number"}
-                }
-            ]
-        )
+        view = modals.CATER_PICKUP.render(date=cater_date, time=cater_time, order_type=cater_type)
     else:
-        cater_sheet = gc.open_by_key(creds.cater_id)
-        drivers_sheet = cater_sheet.worksheet("Sheet2")
-        list_of_rows = drivers_sheet.get_values("A2:B")
-        driver_options = []
-        for row in list_of_rows:
-            driver_options.append(
-                {
-                    "text": {"type": "plain_text", "text": row[0]},
-                    "value": row[0]
-                }
-            )
-        blocks.extend(
-            [
-                {
-                    "type": "input",
-                    "block_id": "block_driver",
-                    "label": {"type": "plain_text", "text": "Driver:"},
-                    "element": {
-                        "type": "static_select",
-                        "placeholder": {"type": "plain_text", "text": "Select a driver"},
-                        "options": driver_options,
-                        "action_id": "input_driver"
-                    }
-                },
-                {
-                    "type": "input",
-                    "block_id": "block_customer",
-                    "element": {"type": "plain_text_input", "action_id": "input_customer"},
-                    "label": {"type": "plain_text", "text": "Customer Name"}
-                },
-                {
-                    "type": "input",
-                    "block_id": "block_address",
-                    "element": {"type": "plain_text_input", "action_id": "input_address"},
-                    "label": {"type": "plain_text", "text": "Address"}
-                },
-                {
-                    "type": "input",
-                    "block_id": "block_phone",
-                    "element": {"type": "plain_text_input", "action_id": "input_phone"},
-                    "label": {"type": "plain_text", "text": "Phone Number"}
-                }
-            ]
-        )
+        list_of_rows = (await sheets.get_values(creds.cater_id, "Sheet2"))[1:]
+        drivers = templates.options([row[0] for row in list_of_rows])
+        view = modals.CATER_DELIVERY.render(date=cater_date, time=cater_time, order_type=cater_type,
+                                            drivers=drivers)
     await client.views_update(
         view_id=body['view']['id'],
         hash=body['view']['hash'],
-        view={
-            "type": "modal",
-            "callback_id": "cater_add_view",
-            "title": {"type": "plain_text", "text": "Add Catering Order"},
-            "submit": {"type": "plain_text", "text": "Add"},
-            "blocks": blocks
-        }
+        view=view
     )
 
 
@@ -1117,93 +809,86 @@ async def cater_add(ack, body, client, view):
     regex = r"^(\+\d{1,2}\s?)?\(?\d{3}\)?[\s.-]?\d{3}[\s.-]?\d{4}$"
     if not re.match(regex, cater_phone):
         errors['block_phone'] = "Please enter a valid, 10 digit phone number"
-    if len(errors) > 0:
-        return await ack(response_action="errors", errors=errors)
-    await ack()
-    # Add new data to spreadsheet
-    spreadsheet = gc.open_by_key(creds.cater_id)
-    sheet = spreadsheet.worksheet("Sheet1")
-    if cater_type == "pickup":
-        to_post = [cater_date, cater_time, "PICKUP", cater_guest, "", cater_phone]
-        confirm_block = [
-            {
-                "type": "section",
-                "text": {
-                    "type": "mrkdwn",
-                    "text": f"New Pickup Order has been added to the <{creds.cater_link}|Catering Sheet>."
-                }
-            },
-            {
-                "type": "section",
-                "fields": [
-                    {
-                        "type": "mrkdwn",
-                        "text": f"*Guest Name:*\n{cater_guest}"
-                    },
-                    {
-                        "type": "mrkdwn",
-                        "text": f"*Date:*\n{cater_date}"
-                    },
-                    {
+
+    async def work():
+        # Add new data to spreadsheet
+        if cater_type == "pickup":
+            to_post = [cater_date, cater_time, "PICKUP", cater_guest, "", cater_phone]
+            confirm_block = [
+                {
+                    "type": "section",
+                    "text": {
                         "type": "mrkdwn",
-                        "text": f"*Time:*\n{cater_time}"
+                        "text": f"New Pickup Order has been added to the <{creds.cater_link}|Catering Sheet>."
                     }
-                ]
-            }
-        ]
-    else:
-        cater_driver = view['state']['values']['block_driver']['input_driver']['selected_option']['value']
-        cater_address = view['state']['values']['block_address']['input_address']['value']
-        to_post = [cater_date, cater_time, cater_driver, cater_guest, cater_address, cater_phone]
-        confirm_block = [
-            {
-                "type": "section",
-                "text": {
-                    "type": "mrkdwn",
-                    "text": f"New Delivery Order has been added to the <{creds.cater_link}|Catering Sheet>."
+                },
+                {
+                    "type": "section",
+                    "fields": [
+                        {
+                            "type": "mrkdwn",
+                            "text": f"*Guest Name:*\n{cater_guest}"
+                        },
+                        {
+                            "type": "mrkdwn",
+                            "text": f"*Date:*\n{cater_date}"
+                        },
+                        {
+                            "type": "mrkdwn",
+                            "text": f"*Time:*\n{cater_time}"
+                        }
+                    ]
                 }
-            },
-            {
-                "type": "section",
-                "fields": [
-                    {
-                        "type": "mrkdwn",
-                        "text": f"*Guest Name:*\n{cater_guest}"
-                    },
-                    {
-                        "type": "mrkdwn",
-                        "text": f"*Date:*\n{cater_date}"
-                    },
-                    {
-                        "type": "mrkdwn",
-                        "text": f"*Time:*\n{cater_time}"
-                    }
-                ]
-            },
-            {
-                "type": "section",
-                "fields": [
-                    {
+            ]
+        else:
+            cater_driver = view['state']['values']['block_driver']['input_driver']['selected_option']['value']
+            cater_address = view['state']['values']['block_address']['input_address']['value']
+            to_post = [cater_date, cater_time, cater_driver, cater_guest, cater_address, cater_phone]
+            confirm_block = [
+                {
+                    "type": "section",
+                    "text": {
                         "type": "mrkdwn",
-                        "text": f"*Driver:*\n{cater_driver}"
+                        "text": f"New Delivery Order has been added to the <{creds.cater_link}|Catering Sheet>."
                     }
-                ]
-            }
-        ]
-    new_row = sheet.append_row(to_post, value_input_option="USER_ENTERED")
-    # This is a hack because gspread doesn't respond with the new row number as an int
-    last_row = int(new_row['updates']['updatedRange'][-3:])
-    # Sort sheet
-    sheet.sort((1, "asc"), (2, "asc"))
-    # Notify user of completion
-    await client.chat_postMessage(channel=creds.cater_channel,
-                                  blocks=confirm_block,
-                                  text=f"New {cater_type} order has been added to the Catering Sheet.",
-                                  user=body['user']['id'])
-    # make sure the catering sheet isn't getting too long
-    # because of the last_row hack above, the new row has to be 3 digits (e.g. row 1000 is bad)
-    if last_row > 900:
-        sheet.delete_rows(2, 100)
+                },
+                {
+                    "type": "section",
+                    "fields": [
+                        {
+                            "type": "mrkdwn",
+                            "text": f"*Guest Name:*\n{cater_guest}"
+                        },
+                        {
+                            "type": "mrkdwn",
+                            "text": f"*Date:*\n{cater_date}"
+                        },
+                        {
+                            "type": "mrkdwn",
+                            "text": f"*Time:*\n{cater_time}"
+                        }
+                    ]
+                },
+                {
+                    "type": "section",
+                    "fields": [
+                        {
+                            "type": "mrkdwn",
+                            "text": f"*Driver:*\n{cater_driver}"
+                        }
+                    ]
+                }
+            ]
+        await cater_orders.add(to_post)
+        # Notify user of completion
+        await client.chat_postMessage(channel=creds.cater_channel,
+                                      blocks=confirm_block,
+                                      text=f"New {cater_type} order has been added to the Catering Sheet.",
+                                      user=body['user']['id'])
+        # keep the catering sheet short by moving old orders to the archive tab
+        await cater_orders.archive_past()
+
+    await jobs.dispatch(ack, work, client, body['user']['id'], "adding the catering order", errors)
 
 
 @app.view("cater_remove_view")
@@ -1212,15 +897,21 @@ async def cater_remove(ack, body, client, view):
     logger.info("Processing catering remove info...")
     cater_row = view['state']['values']['block_order']['input_order']['selected_option']['value']
     channel_id = view['blocks'][-1]['elements'][0]['text']
-    await ack()
-    # Delete specified row
-    spreadsheet = gc.open_by_key(creds.cater_id)
-    sheet = spreadsheet.worksheet("Sheet1")
-    sheet.delete_rows(int(cater_row))
-    # Notify user of completion
-    await client.chat_postEphemeral(channel=channel_id,
-                                    text="The specified order has been removed from the spreadsheet.",
-                                    user=body['user']['id'])
+
+    async def work():
+        # Delete specified row
+        row_num, order = cater_row.split(":")
+        if await cater_orders.remove(int(row_num), order) is None:
+            return await client.chat_postEphemeral(channel=channel_id,
+                                                   text="That order isn't on the sheet anymore. It may have been "
+                                                        "removed or changed already.",
+                                                   user=body['user']['id'])
+        # Notify user of completion
+        await client.chat_postEphemeral(channel=channel_id,
+                                        text="The specified order has been removed from the spreadsheet.",
+                                        user=body['user']['id'])
+
+    await jobs.dispatch(ack, work, client, body['user']['id'], "removing the catering order")
 
 
 @app.command("/add")
@@ -1238,103 +929,9 @@ async def add_trello(ack, body, client):
     await ack()
     await client.views_open(
         trigger_id=body['trigger_id'],
-        view={
-            "type": "modal",
-            "callback_id": "add_view",
-            "title": {"type": "plain_text", "text": "Add New Hire"},
-            "submit": {"type": "plain_text", "text": "Submit"},
-            "blocks": [
-                {
-                    "type": "input",
-                    "block_id": "input_a",
-                    "label": {"type": "plain_text", "text": "Location:"},
-                    "element": {
-                        "type": "static_select",
-                        "placeholder": {
-                            "type": "plain_text",
-                            "text": "Select FOH or BOH"
-                        },
-                        "action_id": "select_1",
-                        "options": [
-                            {
-                                "text": {
-                                    "type": "plain_text",
-                                    "text": "Front of House"
-                                },
-                                "value": "FOH"
-                            },
-                            {
-                                "text": {
-                                    "type": "plain_text",
-                                    "text": "Back of House"
-                                },
-                                "value": "BOH"
-                            }
-                        ]
-                    }
-                },
-                {
-                    "type": "input",
-                    "block_id": "input_b",
-                    "label": {"type": "plain_text", "text": "Full Name:"},
-                    "element": {
-                        "type": "plain_text_input",
-                        "action_id": "full_name",
-                        "multiline": False
-                    },
-                    "optional": False
-                },
-                {
-                    "type": "input",
-                    "block_id": "input_c",
-                    "label": {"type": "plain_text", "text": "Select start date:"},
-                    "element": {
-                        "type": "datepicker",
-                        "action_id": "start_date",
-                        "initial_date": str(date.today()),
-                        "placeholder": {
-                            "type": "plain_text",
-                            "text": "Start date"
-                        }
-                    }
-                },
-                {
-                    "type": "input",
-                    "block_id": "input_d",
-                    "label": {"type": "plain_text", "text": "Food Card Number:"},
-                    "element": {
-                        "type": "plain_text_input",
-                        "action_id": "food_card_number",
-                        "multiline": False
-                    },
-                    "optional": True
-                },
-                {
-                    "type": "input",
-                    "block_id": "input_e",
-                    "label": {"type": "plain_text", "text": "Food Card Expiration:"},
-                    "element": {
-                        "type": "datepicker",
-                        "action_id": "food_card_date",
-                        "initial_date": str(date.today() + timedelta(weeks=150)),
-                        "placeholder": {
-                            "type": "plain_text",
-                            "text": "Expiration date"
-                        }
-                    }
-                },
-                {
-                    "type": "context",
-                    "block_id": "context_a",
-                    "elements": [
-                        {
-                            "type": "plain_text",
-                            "text": body['channel_id']
-                        }
-                    ]
-                }
-            ]
-        }
+        view=modals.ADD_HIRE.render(start_date=str(date.today()),
+                                    card_expiration=str(date.today() + timedelta(weeks=150)),
+                                    channel_id=body['channel_id'])
     )
 
 
@@ -1349,9 +946,6 @@ async def handle_add_view(ack, body, client, view):
     food_card_number = view['state']['values']['input_d']['food_card_number']['value']
     food_card_expiration = view['state']['values']['input_e']['food_card_date']['selected_date']
     channel_id = view['blocks'][-1]['elements'][0]['text']
-    # Get user name from body
-    user = await client.users_info(user=body['user']['id'])
-    user_name = user['user']['real_name']
     # Add card to Trello
     if location == "FOH":
         list_id = creds.trello_foh_list
@@ -1360,110 +954,112 @@ async def handle_add_view(ack, body, client, view):
         list_id = creds.trello_boh_list
         card_id = creds.trello_boh_card
     card_name = name + " (" + start_date[5:7] + "/" + start_date[8:10] + "/" + start_date[:4] + ")"
-    await ack()
-    headers = {
-        "Accept": "application/json"
-    }
-    query = {
-        "name": card_name,
-        "pos": "bottom",
-        "idList": list_id,
-        "idCardSource": card_id,
-        "key": creds.trello_key,
-        "token": creds.trello_token
-    }
-    r = requests.post("https://api.trello.com/1/cards", headers=headers, params=query)
-    if r.status_code == 200:
-        data = json.loads(r.content)
-        trello_url = data['shortUrl']
-        blocks = [
-            {
-                "type": "section",
-                "text": {"type": "mrkdwn", "text": f"{name} successfully added to the Trello {location} board.\n"
-                                                   f"<{trello_url}|Click here to access card>"}
-            },
-            {
-                "type": "context",
-                "elements": [
-                    {
-                        "type": "plain_text",
-                        "text": f"Submitted by: {user_name}"
-                    }
-                ]
-            }
-        ]
-        await client.chat_postMessage(channel=channel_id,
-                                      blocks=blocks,
-                                      text=f"{name} added to {location} Trello board.")
-    else:
-        failure_text = f"Failed to add {name} to {location} Trello board. Error code: {r.status_code}"
-        blocks = [
-            {
-                "type": "section",
-                "text": {"type": "plain_text", "text": failure_text}
-            },
-            {
-                "type": "context",
-                "elements": [
-                    {
-                        "type": "plain_text",
-                        "text": f"Submitted by: {user_name}"
-                    }
-                ]
-            }
-        ]
-        await client.chat_postMessage(channel=channel_id,
-                                      blocks=blocks,
-                                      text=f"{name} failed to add to {location} Trello board.")
-        await client.chat_postMessage(channel=creds.pj_user_id,
-                                      text=f"There was an error while adding {name} to {location} Trello board.")
-    # add user to CFA Staff spreadsheet (for use in /sick dropdown list)
-    staff_sheet = staff_spreadsheet.worksheet("Staff")
-    staff_sheet.append_row([name], value_input_option="USER_ENTERED")
-    staff_sheet.sort([1, "asc"])
-    # if staff_sheet.row_count > 100:
-    #     await client.chat_postMessage(channel=channel_id,
-    #                                   text="The number of rows in CFA Staff has exceeded 100. This will cause the "
-    #                                        "/sick command to stop working. Please notify Patrick as soon as "
-    #                                        "possible so old names can be removed.")
-    # add user to Pay Scale Tracking
-    sh = gc.open_by_key(creds.pay_scale_id)
-    pay_sheet = sh.worksheet("Champs Info")
-    to_post = [name, "Team Member", "", start_date]
-    pay_sheet.append_row(to_post, value_input_option="USER_ENTERED")
-    pay_sheet.sort([1, "asc"])
-    # add user to Food Handlers Card Sheet
-    sh = gc.open_by_key(creds.card_id)
-    card_sheet = sh.worksheet("Food handler cards")
-    name_list = name.split(" ")
-    reverse_name = ", ".join([name_list[1], name_list[0]])
-    to_post = [reverse_name, food_card_number, food_card_expiration]
-    card_sheet.append_row(to_post, value_input_option="USER_ENTERED")
-    card_sheet.sort([3, "asc"])
+
+    async def work():
+        user_name = await profiles.real_name(client, body['user']['id'])
+        headers = {
+            "Accept": "application/json"
+        }
+        query = {
+            "name": card_name,
+            "pos": "bottom",
+            "idList": list_id,
+            "idCardSource": card_id,
+            "key": creds.trello_key,
+            "token": creds.trello_token
+        }
+        # not idempotent, a retry after a server error could make a second card
+        r = await http_client.post("https://api.trello.com/1/cards", headers=headers, params=query, idempotent=False)
+        if r.status_code == 200:
+            data = r.json()
+            trello_url = data['shortUrl']
+            blocks = [
+                {
+                    "type": "section",
+                    "text": {"type": "mrkdwn", "text": f"{name} successfully added to the Trello {location} board.\n"
+                                                       f"<{trello_url}|Click here to access card>"}
+                },
+                {
+                    "type": "context",
+                    "elements": [
+                        {
+                            "type": "plain_text",
+                            "text": f"Submitted by: {user_name}"
+                        }
+                    ]
+                }
+            ]
+            await client.chat_postMessage(channel=channel_id,
+                                          blocks=blocks,
+                                          text=f"{name} added to {location} Trello board.")
+        else:
+            failure_text = f"Failed to add {name} to {location} Trello board. Error code: {r.status_code}"
+            blocks = [
+                {
+                    "type": "section",
+                    "text": {"type": "plain_text", "text": failure_text}
+                },
+                {
+                    "type": "context",
+                    "elements": [
+                        {
+                            "type": "plain_text",
+                            "text": f"Submitted by: {user_name}"
+                        }
+                    ]
+                }
+            ]
+            await client.chat_postMessage(channel=channel_id,
+                                          blocks=blocks,
+                                          text=f"{name} failed to add to {location} Trello board.")
+            await client.chat_postMessage(channel=creds.pj_user_id,
+                                          text=f"There was an error while adding {name} to {location} Trello board.")
+        # add user to CFA Staff spreadsheet (for use in /sick dropdown list)
+        tm_id = team.resolve(name)
+        # in case this is a rehire
+        team.set_departed(tm_id, "")
+        await sheets.sorted_insert(creds.staff_id, "Staff", [name, tm_id])
+        # if staff_sheet.row_count > 100:
+        #     await client.chat_postMessage(channel=channel_id,
+        #                                   text="The number of rows in CFA Staff has exceeded 100. This will cause the "
+        #                                        "/sick command to stop working. Please notify Patrick as soon as "
+        #                                        "possible so old names can be removed.")
+        # add user to Pay Scale Tracking
+        to_post = [name, "Team Member", "", start_date]
+        await sheets.sorted_insert(creds.pay_scale_id, "Champs Info", to_post, header_rows=1)
+        # add user to Food Handlers Card Sheet
+        name_list = name.split(" ")
+        reverse_name = ", ".join([name_list[1], name_list[0]])
+        to_post = [reverse_name, food_card_number, food_card_expiration]
+        await sheets.sorted_insert(creds.card_id, "Food handler cards", to_post, col=3, sort_key=sheets.date_key,
+                                   header_rows=1)
+
+    await jobs.dispatch(ack, work, client, body['user']['id'], "adding the new team member")
 
 
 async def depart_tm(now_str, name, last_date, rehire, reason):
     """Removes TM from CFA Staff and PAy Scale sheets and adds their info to CFA Departures"""
     # Add info to CFA Departures
-    departure_spreadsheet = gc.open_by_key(creds.departure_id)
-    departure_sheet = departure_spreadsheet.worksheet("Departures")
-    to_post = [now_str, name, last_date, rehire, reason]
-    departure_sheet.append_row(to_post, value_input_option='USER_ENTERED')
+    departure_sheet = await sheets.worksheet(creds.departure_id, "Departures")
+    tm_id = team.resolve(name)
+    to_post = [now_str, name, last_date, rehire, reason, tm_id]
+    await sheets.call(departure_sheet.append_row, to_post, value_input_option='USER_ENTERED',
+                      idempotent=False)
+    team.set_departed(tm_id, last_date)
     # Remove name from CFA Staff
     # Since the name was selected from CFA Staff, there shouldn't be any problem finding it
-    staff_sheet = staff_spreadsheet.get_worksheet(0)
-    cell = staff_sheet.find(name)
-    if cell:
-        staff_sheet.update_cell(cell.row, cell.col, "")
-        staff_sheet.sort([1, "asc"])
-    # Remove name from Pay Scale Tracking
-    payscale_spreadsheet = gc.open_by_key(creds.pay_scale_id)
-    payscale_sheet = payscale_spreadsheet.get_worksheet(0)
-    cell = payscale_sheet.find(name)
-    try:
-        payscale_sheet.delete_rows(cell.row)
-    except AttributeError:
-        pass
+    if await sheets.sorted_remove(creds.staff_id, "Staff", name) is None:
+        await report_not_removed(name, "CFA Staff")
+    # Remove name from Pay Scale Tracking. Same tab name /add inserts through, so they share a cached copy.
+    if await sheets.sorted_remove(creds.pay_scale_id, "Champs Info", name, header_rows=1) is None:
+        await report_not_removed(name, "Pay Scale Tracking")
+
+
+async def report_not_removed(name, sheet_name):
+    logger.warning(f"Couldn't find {name} on {sheet_name} to remove them")
+    await client.chat_postMessage(channel=creds.pj_user_id,
+                                  text=f"{name} departed but wasn't found on {sheet_name}, so they are still "
+                                       f"listed there. Please remove them by hand.")
 
 
 @app.command("/depart")
@@ -1472,8 +1068,7 @@ async def remove_tm(ack, body, client):
     name from CFA Staff (/sick command) and Payscale Tracking"""
     await ack()
     # Create options for select menu
-    worksheet = staff_spreadsheet.get_worksheet(0)
-    values = worksheet.col_values(1)
+    values = await staff_names()
     if len(values) > 100:
         await client.chat_postMessage(channel=creds.pj_user_id,
                                       text="The CFA Staff list is full. Time for a purge.")
@@ -1628,43 +1223,40 @@ async def handle_remove_view(ack, body, client, view):
     midnight = datetime.combine(now.date(), datetime.max.time())
     if datetime.strptime(last_date, "%Y-%m-%d") > midnight:
         errors['input_b'] = "The date needs to be today or in the past."
-    if len(errors) > 0:
-        return await ack(response_action="errors", errors=errors)
-    await ack()
-    # Get user name from body
-    user = await client.users_info(user=body['user']['id'])
-    user_name = user['user']['real_name']
-    await depart_tm(now_str, name, last_date, rehire, reason)
-    # respond just so that the user knows it worked
-    blocks = [
-        {
-            "type": "section",
-            "text": {
-                "type": "mrkdwn",
-                "text": f"{name} has been removed from the staff list and added to the Departures sheet."
-            }
-        },
-        {
-            "type": "context",
-            "elements": [
-                {
-                    "type": "plain_text",
-                    "text": f"Submitted by: {user_name}"
+
+    async def work():
+        user_name = await profiles.real_name(client, body['user']['id'])
+        await depart_tm(now_str, name, last_date, rehire, reason)
+        # respond just so that the user knows it worked
+        blocks = [
+            {
+                "type": "section",
+                "text": {
+                    "type": "mrkdwn",
+                    "text": f"{name} has been removed from the staff list and added to the Departures sheet."
                 }
-            ]
-        }
-    ]
-    await client.chat_postEphemeral(channel=channel_id,
-                                    blocks=blocks,
-                                    text=f"{name} has been removed from the system.",
-                                    user=body['user']['id'])
+            },
+            {
+                "type": "context",
+                "elements": [
+                    {
+                        "type": "plain_text",
+                        "text": f"Submitted by: {user_name}"
+                    }
+                ]
+            }
+        ]
+        await client.chat_postEphemeral(channel=channel_id,
+                                        blocks=blocks,
+                                        text=f"{name} has been removed from the system.",
+                                        user=body['user']['id'])
+
+    await jobs.dispatch(ack, work, client, body['user']['id'], "removing the team member", errors)
 
 
 async def get_bag_status():
-    """This pulls TMS bag status from Google Sheets"""
-    sh = gc.open_by_key(creds.tms_id)
-    sheet = sh.get_worksheet(0)
-    tms_values = sheet.get_all_values()[1:]
+    """This pulls TMS bag status from the bag inventory"""
+    checked_out = await tms_bags.checked_out()
     any_checked_out = False
     blocks = [
         {
@@ -1678,28 +1270,27 @@ async def get_bag_status():
             "type": "divider"
         }
     ]
-    for row in tms_values:
-        if row[2]:
-            any_checked_out = True
-            blocks.append(
-                {
-                    "type": "section",
+    for bag in checked_out:
+        any_checked_out = True
+        blocks.append(
+            {
+                "type": "section",
+                "text": {
+                    "type": "mrkdwn",
+                    "text": f"*TMS Bag #{bag.number}*\nChecked out by {bag.driver}\nCurrently at {bag.location}"
+                },
+                "accessory": {
+                    "type": "button",
                     "text": {
-                        "type": "mrkdwn",
-                        "text": f"*TMS Bag #{row[0]}*\nChecked out by {row[2]}\nCurrently at {row[3]}"
+                        "type": "plain_text",
+                        "emoji": True,
+                        "text": "Check In"
                     },
-                    "accessory": {
-                        "type": "button",
-                        "text": {
-                            "type": "plain_text",
-                            "emoji": True,
-                            "text": "Check In"
-                        },
-                        "value": row[0],
-                        "action_id": "req_check_in"
-                    }
+                    "value": bag.number,
+                    "action_id": "req_check_in"
                 }
-            )
+            }
+        )
     return blocks, any_checked_out
 
 
@@ -1792,10 +1383,7 @@ async def handle_req_check_in(ack, respond, client, body):
     await ack()
     # channel_id = body['container']['channel_id']
     value = body['actions'][0]['value']
-    sh = gc.open_by_key(creds.tms_id)
-    sheet = sh.get_worksheet(0)
-    cell = sheet.find(value)
-    sheet.batch_clear([f"B{cell.row}:F{cell.row}"])
+    await tms_bags.check_in(value)
     blocks, any_checked_in = await get_bag_status()
     if any_checked_in:
         await respond(
@@ -1824,8 +1412,7 @@ async def tms_check_out(ack, body, respond, client):
     await ack()
     await respond({"delete_original": True})
     try:
-        sh = gc.open_by_key(creds.tms_id)
-        sheet = sh.get_worksheet(0)
+        available = await tms_bags.available()
     except gspread.exceptions.GSpreadException as e:
         return await client.chat_postMessage(channel=body['user']['id'],
                                              text=e)
@@ -1836,19 +1423,17 @@ async def tms_check_out(ack, body, respond, client):
                                       text=f"There was an error while storing the message to the Google Sheet.\n{e}")
         return
     bag_numbers = []
-    tms_values = sheet.get_all_values()[1:]
-    for row in tms_values:
-        if not row[2] and row[0]:
-            bag_numbers.append(
-                {
-                    "text": {
-                        "type": "plain_text",
-                        "text": f"Bag #{row[0]}",
-                        "emoji": False
-                    },
-                    "value": row[0]
-                }
-            )
+    for bag in available:
+        bag_numbers.append(
+            {
+                "text": {
+                    "type": "plain_text",
+                    "text": f"Bag #{bag.number}",
+                    "emoji": False
+                },
+                "value": bag.number
+            }
+        )
     if len(bag_numbers) == 0:
         return await client.chat_postEphemeral(channel=body['channel']['id'],
                                                text="All bags are currently checked out.",
@@ -1957,21 +1542,15 @@ async def handle_tms_check_out_view(ack, client, view):
     regex = r"^(\+\d{1,2}\s?)?\(?\d{3}\)?[\s.-]?\d{3}[\s.-]?\d{4}$"
     if not re.match(regex, contact_number):
         errors['input_phone'] = "Please enter a valid, 10 digit phone number"
-    if len(errors) > 0:
-        return await ack(response_action="errors", errors=errors)
-    # Update sheet with new info
-    sh = gc.open_by_key(creds.tms_id)
-    sheet = sh.get_worksheet(0)
-    cell = sheet.find(value)
-    sheet.update_cell(cell.row, 2, now)
-    sheet.update_cell(cell.row, 3, name)
-    sheet.update_cell(cell.row, 4, location)
-    sheet.update_cell(cell.row, 5, contact_name)
-    sheet.update_cell(cell.row, 6, contact_number)
-    await ack()
-    await client.chat_postMessage(channel=creds.cater_channel,
-                                  text=f"TMS Bag#{value} has been checked out by {name}.",
-                                  user=user_id)
+
+    async def work():
+        # Update bag inventory (and the sheet) with new info
+        await tms_bags.check_out(value, now, name, location, contact_name, contact_number)
+        await client.chat_postMessage(channel=creds.cater_channel,
+                                      text=f"TMS Bag#{value} has been checked out by {name}.",
+                                      user=user_id)
+
+    await jobs.dispatch(ack, work, client, user_id, "checking out the TMS bag", errors)
 
 
 @app.block_action("tms_in")
@@ -1980,8 +1559,7 @@ async def tms_check_in(ack, body, respond, client):
     await ack()
     await respond({"delete_original": True})
     try:
-        sh = gc.open_by_key(creds.tms_id)
-        sheet = sh.get_worksheet(0)
+        checked_out = await tms_bags.checked_out()
     except gspread.exceptions.GSpreadException as e:
         return await client.chat_postMessage(channel=body['user']['id'],
                                              text=e)
@@ -1992,19 +1570,17 @@ async def tms_check_in(ack, body, respond, client):
                                       text=f"There was an error while storing the message to the Google Sheet.\n{e}")
         return
     bag_numbers = []
-    tms_values = sheet.get_all_values()[1:]
-    for row in tms_values:
-        if row[2]:
-            bag_numbers.append(
-                {
-                    "text": {
-                        "type": "plain_text",
-                        "text": f"Bag #{row[0]}",
-                        "emoji": False
-                    },
-                    "value": row[0]
-                }
-            )
+    for bag in checked_out:
+        bag_numbers.append(
+            {
+                "text": {
+                    "type": "plain_text",
+                    "text": f"Bag #{bag.number}",
+                    "emoji": False
+                },
+                "value": bag.number
+            }
+        )
     if len(bag_numbers) == 0:
         return await client.chat_postEphemeral(channel=body['channel']['id'],
                                                text="There are no bags currently checked out.",
@@ -2060,15 +1636,15 @@ async def handle_tms_check_in_view(ack, client, view):
     logger.info("Processing TMS Check In...")
     value = view['state']['values']['bag_num']['bag_num_action']['selected_option']['value']
     user_id = view['blocks'][-1]['elements'][0]['text']
-    sh = gc.open_by_key(creds.tms_id)
-    sheet = sh.get_worksheet(0)
-    cell = sheet.find(value)
-    sheet.batch_clear([f"B{cell.row}:F{cell.row}"])
-    await ack()
-    await client.chat_postMessage(channel=creds.cater_channel,
-                                  text=f"TMS Bag #{value} has been marked as returned.",
-                                  user=user_id
-                                  )
+
+    async def work():
+        await tms_bags.check_in(value)
+        await client.chat_postMessage(channel=creds.cater_channel,
+                                      text=f"TMS Bag #{value} has been marked as returned.",
+                                      user=user_id
+                                      )
+
+    await jobs.dispatch(ack, work, client, user_id, "checking in the TMS bag")
 
 
 @app.command("/discipline")
@@ -2077,8 +1653,7 @@ async def discipline(ack, body, client):
     in a Google Sheet for historical purposes."""
     await ack()
     # Create options for select menu
-    worksheet = staff_spreadsheet.get_worksheet(0)
-    tm_values = worksheet.col_values(1)
+    tm_values = await staff_names()
     if len(tm_values) > 100:
         await client.chat_postMessage(channel=creds.pj_user_id,
                                       text="The CFA Staff list is full. Time for a purge.")
@@ -2086,119 +1661,10 @@ async def discipline(ack, body, client):
                                              text="The list of staff members has exceed 100 names, preventing "
                                                   "/sick from working properly. Patrick has been notified and "
                                                   "will correct the issue shortly.")
-    tm_names = []
-    for name in tm_values:
-        tm_names.append(
-            {
-                "text": {
-                    "type": "plain_text",
-                    "text": name
-                },
-                "value": name
-            }
-        )
-    # Create list for discipline types
-    discipline_types = []
-    method_types = []
-    method_values = ["Email", "Face-to-Face"]
-    discipline_values = ["Verbal", "Written", "PIP", "Final", "Suspension", "Termination"]
-    for name in discipline_values:
-        discipline_types.append(
-            {
-                "text": {
-                    "type": "plain_text",
-                    "text": name
-                },
-                "value": name
-            }
-        )
-    for name in method_values:
-        method_types.append(
-            {
-                "text": {
-                    "type": "plain_text",
-                    "text": name
-                },
-                "value": name
-            }
-        )
     # Open the view
     await client.views_open(
         trigger_id=body['trigger_id'],
-        view={
-            "type": "modal",
-            "callback_id": "discipline_view",
-            "title": {"type": "plain_text", "text": "Discipline Tracking"},
-            "submit": {"type": "plain_text", "text": "Submit"},
-            "blocks": [
-                {
-                    "type": "input",
-                    "block_id": "input_name",
-                    "label": {"type": "plain_text", "text": "Select a name"},
-                    "element": {
-                        "type": "static_select",
-                        "action_id": "tm_name",
-                        "placeholder": {"type": "plain_text", "text": "Select a name"},
-                        "options": tm_names
-                    }
-                },
-                {
-                    "type": "input",
-                    "block_id": "input_type",
-                    "label": {"type": "plain_text", "text": "Type of Discipline"},
-                    "element": {
-                        "type": "static_select",
-                        "action_id": "discipline_type",
-                        "placeholder": {"type": "plain_text", "text": "Select type of discipline"},
-                        "options": discipline_types
-                    }
-                },
-                {
-                    "type": "input",
-                    "block_id": "input_method",
-                    "label": {"type": "plain_text", "text": "Method of Communication"},
-                    "element": {
-                        "type": "static_select",
-                        "action_id": "method_type",
-                        "placeholder": {"type": "plain_text", "text": "Select method of communication"},
-                        "options": method_types
-                    }
-                },
-                {
-                    "type": "input",
-                    "block_id": "input_reason",
-                    "label": {"type": "plain_text", "text": "Reason for Discipline"},
-                    "element": {
-                        "type": "plain_text_input",
-                        "action_id": "reason",
-                        "multiline": True
-                    },
-                    "optional": False
-                },
-                {
-                    "type": "input",
-                    "block_id": "input_leader",
-                    "label": {"type": "plain_text", "text": "Your Name (Leader providing discipline)"},
-                    "element": {
-                        "type": "plain_text_input",
-                        "action_id": "leader",
-                        "multiline": False
-                    },
-                    "optional": False
-                },
-                {
-                    "type": "input",
-                    "block_id": "input_other",
-                    "label": {"type": "plain_text", "text": "Other notes"},
-                    "element": {
-                        "type": "plain_text_input",
-                        "action_id": "other",
-                        "multiline": False
-                    },
-                    "optional": True
-                }
-            ]
-        }
+        view=modals.DISCIPLINE.render(names=templates.options(tm_values))
     )
 
 
@@ -2229,159 +1695,74 @@ async def handle_discipline_view(ack, body, client, view):
     else:
         # Send data to Google Sheet
         try:
-            sh = gc.open_by_key(creds.sick_log_id)
-            sheet = sh.get_worksheet(1)
             now = str(datetime.date(datetime.today()))
-            to_post = [now, name, discipline_type, reason, leader, method_value, other]
-            sheet.append_row(to_post)
-        except gspread.exceptions.GSpreadException as e:
-            return await client.chat_postMessage(channel=body['user']['id'], text=e)
+            to_post = [now, name, discipline_type, reason, leader, method_value, other, team.resolve(name)]
+            await sheets.append_later(creds.sick_log_id, 1, to_post)
         except Exception as e:
             await client.chat_postMessage(channel=body['user']['id'],
                                           text=f"There was an error while storing the message to the Google Sheet.\n{e}")
             await client.chat_postMessage(channel=creds.pj_user_id,
                                           text=f"There was an error while storing the message to the Google Sheet.\n{e}")
             return
-    user = await client.users_info(user=body['user']['id'])
-    user_name = user['user']['real_name']
+    user_name = await profiles.real_name(client, body['user']['id'])
     blocks = [
         {
             "type": "section",
-            "text": {
-                "type": "mrkdwn",
-                "text": f"New discipline recorded:\n<{creds.sick_log_link}|Click here to view in Google Sheets>"
-            }
-        },
-        {
-            "type": "section",
-            "text": {"type": "mrkdwn", "text": block_text},
-            "accessory": {
-                "type": "image",
-                "image_url": "http://www.mayodev.com/images/discipline.png",
-                "alt_text": "Discipline image"
-            }
-        },
-        {
-            "type": "context",
-            "elements": [
-                {
-                    "type": "plain_text",
-                    "text": f"Submitted by: {user_name}"
-                }
-            ]
-        }
-    ]
-    await client.chat_postMessage(channel=creds.sick_channel,
-                                  blocks=blocks,
-                                  text=f"New discipline for {name}.  Review the sheet <{creds.sick_log_link}|here>.")
-
-
-@app.command("/sick")
-async def sick(ack, body, client):
-    """This command opens the form for tracking missed shifts.  I called it 'sick' but it's for any time someone
-    misses a shift, including No Call, No Shows.  It pulls the list of Team Members from a Google Sheet that is
-    literally just a list of TM names (first last).  Slack limits its dropdown (select) lists to 100 items, so I
-    chose to limit my list of names to Team Members and Team Leads only.
-
-    I used a dropdown because I don't trust anyone to spell names properly. :)
-
-    Example usage:
-    /sick
-    """
-    await ack()
-    # Create options for select menu
-    worksheet = staff_spreadsheet.get_worksheet(0)
-    values = worksheet.col_values(1)
-    if len(values) > 100:
-        await client.chat_postMessage(channel=creds.pj_user_id,
-                                      text="The CFA Staff list is full. Time for a purge.")
-        return await client.chat_postMessage(channel=creds.sick_channel,
-                                             text="The list of staff members has exceed 100 names, preventing "
-                                                  "/sick from working properly. Patrick has been notified and "
-                                                  "will correct the issue shortly.")
-    options = []
-    for name in values:
-        options.append(
-            {
-                "text": {
-                    "type": "plain_text",
-                    "text": name
-                },
-                "value": name
-            }
-        )
-    # open the view
-    await client.views_open(
-        trigger_id=body['trigger_id'],
-        view={
-            "type": "modal",
-            "callback_id": "sick_view",
-            "title": {"type": "plain_text", "text": "Missed Shift"},
-            "submit": {"type": "plain_text", "text": "Submit"},
-            "blocks": [
-                {
-                    "type": "input",
-                    "block_id": "input_a",
-                    "label": {"type": "plain_text", "text": "Name"},
-                    "element": {
-                        "type": "static_select",
-                        "action_id": "tm_name",
-                        "placeholder": {"type": "plain_text", "text": "Select a name"},
-                        "options": options
-                    }
-                },
-                {
-                    "type": "input",
-                    "block_id": "input_b",
-                    "label": {"type": "plain_text", "text": "Callout Reason"},
-                    "element": {
-                        "type": "plain_text_input",
-                        "action_id": "reason",
-                        "multiline": False
-                    },
-                    "optional": False,
-                    "hint": {"type": "plain_text", "text": "Use NCNS for No Call/No Show"}
-                },
-                {
-                    "type": "input",
-                    "block_id": "input_c",
-                    "label": {"type": "plain_text", "text": "Missed Shift"},
-                    "element": {
-                        "type": "plain_text_input",
-                        "action_id": "shift",
-                        "multiline": False
-                    },
-                    "optional": False,
-                    "hint": {"type": "plain_text", "text": "Position and Time"}
-                },
-                {
-                    "type": "input",
-                    "block_id": "input_d",
-                    "label": {"type": "plain_text", "text": "Contact Person/Method"},
-                    "element": {
-                        "type": "plain_text_input",
-                        "action_id": "contact",
-                        "multiline": False
-                    },
-                    "optional": False,
-                    "hint": {
-                        "type": "plain_text",
-                        "text": "Hot Schedules or the name of the leader that spoke to the TM"
-                    }
-                },
+            "text": {
+                "type": "mrkdwn",
+                "text": f"New discipline recorded:\n<{creds.sick_log_link}|Click here to view in Google Sheets>"
+            }
+        },
+        {
+            "type": "section",
+            "text": {"type": "mrkdwn", "text": block_text},
+            "accessory": {
+                "type": "image",
+                "image_url": "http://www.mayodev.com/images/discipline.png",
+                "alt_text": "Discipline image"
+            }
+        },
+        {
+            "type": "context",
+            "elements": [
                 {
-                    "type": "input",
-                    "block_id": "input_e",
-                    "label": {"type": "plain_text", "text": "Other notes"},
-                    "element": {
-                        "type": "plain_text_input",
-                        "action_id": "other",
-                        "multiline": False
-                    },
-                    "optional": True
+                    "type": "plain_text",
+                    "text": f"Submitted by: {user_name}"
                 }
             ]
         }
+    ]
+    await client.chat_postMessage(channel=creds.sick_channel,
+                                  blocks=blocks,
+                                  text=f"New discipline for {name}.  Review the sheet <{creds.sick_log_link}|here>.")
+
+
+@app.command("/sick")
+async def sick(ack, body, client):
+    """This command opens the form for tracking missed shifts.  I called it 'sick' but it's for any time someone
+    misses a shift, including No Call, No Shows.  It pulls the list of Team Members from a Google Sheet that is
+    literally just a list of TM names (first last).  Slack limits its dropdown (select) lists to 100 items, so I
+    chose to limit my list of names to Team Members and Team Leads only.
+
+    I used a dropdown because I don't trust anyone to spell names properly. :)
+
+    Example usage:
+    /sick
+    """
+    await ack()
+    # Create options for select menu
+    values = await staff_names()
+    if len(values) > 100:
+        await client.chat_postMessage(channel=creds.pj_user_id,
+                                      text="The CFA Staff list is full. Time for a purge.")
+        return await client.chat_postMessage(channel=creds.sick_channel,
+                                             text="The list of staff members has exceed 100 names, preventing "
+                                                  "/sick from working properly. Patrick has been notified and "
+                                                  "will correct the issue shortly.")
+    # open the view
+    await client.views_open(
+        trigger_id=body['trigger_id'],
+        view=modals.SICK.render(names=templates.options(values))
     )
 
 
@@ -2404,22 +1785,16 @@ async def handle_sick_input(ack, body, client, view):
     await ack()
     # Send data to Google Sheet
     try:
-        sh = gc.open_by_key(creds.sick_log_id)
-        sheet = sh.get_worksheet(0)
         now = str(datetime.date(datetime.today()))
-        to_post = [now, name, reason, shift, contact, other]
-        sheet.append_row(to_post)
-    except gspread.exceptions.GSpreadException as e:
-        return await client.chat_postMessage(channel=body['user']['id'],
-                                             text=e)
+        to_post = [now, name, reason, shift, contact, other, team.resolve(name)]
+        await sheets.append_later(creds.sick_log_id, 0, to_post)
     except Exception as e:
         await client.chat_postMessage(channel=body['user']['id'],
                                       text=f"There was an error while storing the message to the Google Sheet.\n{e}")
         await client.chat_postMessage(channel=creds.pj_user_id,
                                       text=f"There was an error while storing the message to the Google Sheet.\n{e}")
         return
-    user = await client.users_info(user=body['user']['id'])
-    user_name = user['user']['real_name']
+    user_name = await profiles.real_name(client, body['user']['id'])
     blocks = [
         {
             "type": "section",
@@ -2470,179 +1845,16 @@ async def no_waste(ack, body, client):
 async def waste_command(ack, body, client):
     """Allows for intermittent waste reports outside of designated times"""
     await ack()
-    blocks = [
-        {
-            "type": "context",
-            "block_id": "input_a",
-            "elements": [{
-                "type": "plain_text",
-                "text": "placeholder"
-            }]
-        },
-        {
-            "type": "context",
-            "block_id": "input_a2",
-            "elements": [{
-                "type": "plain_text",
-                "text": "placeholder"
-            }]
-        },
-        {
-            "type": "section",
-            "block_id": "section_info",
-            "text": {
-                "type": "plain_text",
-                "text": "Please enter weight as a decimal. For example, 1.25 instead of 1lb 4oz."
-            }
-        },
-        {
-            "type": "input",
-            "block_id": "input_b",
-            "label": {"type": "plain_text", "text": "Regular Filets"},
-            "element": {
-                "type": "plain_text_input",
-                "action_id": "regulars",
-                "initial_value": "0"
-            },
-            "hint": {"type": "plain_text", "text": "Weight in decimal pounds"}
-        },
-        {
-            "type": "input",
-            "block_id": "input_c",
-            "label": {"type": "plain_text", "text": "Spicy Filets"},
-            "element": {
-                "type": "plain_text_input",
-                "action_id": "spicy",
-                "initial_value": "0"
-            },
-            "hint": {"type": "plain_text", "text": "Weight in decimal pounds"}
-        },
-        {
-            "type": "input",
-            "block_id": "input_d",
-            "label": {"type": "plain_text", "text": "Nuggets"},
-            "element": {
-                "type": "plain_text_input",
-                "action_id": "nuggets",
-                "initial_value": "0"
-            },
-            "hint": {"type": "plain_text", "text": "Weight in decimal pounds"}
-        },
-        {
-            "type": "input",
-            "block_id": "input_e",
-            "label": {"type": "plain_text", "text": "Strips"},
-            "element": {
-                "type": "plain_text_input",
-                "action_id": "strips",
-                "initial_value": "0"
-            },
-            "hint": {"type": "plain_text", "text": "Weight in decimal pounds"}
-        },
-        {
-            "type": "input",
-            "block_id": "input_f",
-            "label": {"type": "plain_text", "text": "Grilled Filets"},
-            "element": {
-                "type": "plain_text_input",
-                "action_id": "grilled1",
-                "initial_value": "0"
-            },
-            "hint": {"type": "plain_text", "text": "Weight in decimal pounds"}
-        },
-        {
-            "type": "input",
-            "block_id": "input_g",
-            "label": {"type": "plain_text", "text": "Grilled Nuggets"},
-            "element": {
-                "type": "plain_text_input",
-                "action_id": "grilled2",
-                "initial_value": "0"
-            },
-            "hint": {"type": "plain_text", "text": "Weight in decimal pounds"}
-        }
-    ]
     # If it's before 1pm, include the breakfast meats as well.
-    if datetime.now().hour < 13:
-        blocks.append(
-            {
-                "type": "input",
-                "block_id": "input_h",
-                "label": {"type": "plain_text", "text": "Breakfast Filets"},
-                "element": {
-                    "type": "plain_text_input",
-                    "action_id": "breakfast",
-                    "initial_value": "0"
-                },
-                "hint": {"type": "plain_text", "text": "Weight in decimal pounds"}
-            }
-        )
-        blocks.append(
-            {
-                "type": "input",
-                "block_id": "input_k",
-                "label": {"type": "plain_text", "text": "Spicy Breakfast Filets"},
-                "element": {
-                    "type": "plain_text_input",
-                    "action_id": "spicy_breakfast",
-                    "initial_value": "0"
-                },
-                "hint": {"type": "plain_text", "text": "Weight in decimal pounds"}
-            }
-        )
-        blocks.append(
-            {
-                "type": "input",
-                "block_id": "input_i",
-                "label": {"type": "plain_text", "text": "Grilled Breakfast"},
-                "element": {
-                    "type": "plain_text_input",
-                    "action_id": "grilled3",
-                    "initial_value": "0"
-                },
-                "hint": {"type": "plain_text", "text": "Weight in decimal pounds"}
-            }
-        )
-    blocks.append(
-        {
-            "type": "input",
-            "block_id": "input_j",
-            "label": {"type": "plain_text", "text": "Additional Info"},
-            "element": {
-                "type": "plain_text_input",
-                "action_id": "other",
-                "multiline": True
-            },
-            "optional": True
-        }
-    )
+    template = modals.WASTE_BREAKFAST if datetime.now().hour < 13 else modals.WASTE
     try:
         msg_ts = body['container']['message_ts']
     except KeyError:
         msg_ts = "placeholder"
-    blocks.append(
-        {
-            "type": "context",
-            "block_id": "context_a",
-            "elements": [
-                {
-                    "type": "plain_text",
-                    "text": msg_ts
-                }
-            ]
-        }
-    )
-    logger.info("Blocks ready. Open view.")
     try:
         await client.views_open(
             trigger_id=body['trigger_id'],
-            view={
-                "type": "modal",
-                "callback_id": "waste_view",
-                "title": {"type": "plain_text", "text": "Waste Form"},
-                "submit": {"type": "plain_text", "text": "Submit"},
-                "blocks": blocks
-            }
+            view=template.render(message_ts=msg_ts)
         )
     except Exception as e:
         logger.error(f"Error: {e}")
@@ -2676,207 +1888,13 @@ async def waste_view(ack, body, client):
     logger.info("Start waste view process...")
     # message_ts = view['blocks'][-1]['elements'][0]['text']
     # Retrieve leaders from Staff Google Sheet
-    sheet = staff_spreadsheet.worksheet("Leaders")
-    sheet_values = sheet.get_all_values()
-    leader_options = []
-    for row in sheet_values:
-        if row[4] == "BOH":
-            leader_options.append(
-                {
-                    "text": {
-                        "type": "plain_text",
-                        "text": row[0]
-                    },
-                    "value": row[0]
-                }
-            )
-    # Assign time options
-    time_options = []
-    for _time in creds.times:
-        time_options.append(
-            {
-                "text": {
-                    "type": "plain_text",
-                    "text": _time
-                },
-                "value": _time
-            }
-        )
-    blocks = [
-        {
-            "type": "input",
-            "block_id": "input_a",
-            "label": {"type": "plain_text", "text": "Leaders on"},
-            "element": {
-                "type": "multi_static_select",
-                "action_id": "leader_names",
-                "placeholder": {"type": "plain_text", "text": "Select leaders"},
-                "options": leader_options
-            }
-        },
-        {
-            "type": "input",
-            "block_id": "input_a2",
-            "label": {"type": "plain_text", "text": "Report Time(s) Covered"},
-            "element": {
-                "type": "multi_static_select",
-                "action_id": "times",
-                "placeholder": {"type": "plain_text", "text": "Times covered"},
-                "options": time_options
-            }
-        },
-        {
-            "type": "section",
-            "block_id": "section_info",
-            "text": {
-                "type": "plain_text",
-                "text": "Please enter weight as a decimal. For example, 1.25 instead of 1lb 4oz."
-            }
-        },
-        {
-            "type": "input",
-            "block_id": "input_b",
-            "label": {"type": "plain_text", "text": "Regular Filets"},
-            "element": {
-                "type": "plain_text_input",
-                "action_id": "regulars",
-                "initial_value": "0"
-            },
-            "hint": {"type": "plain_text", "text": "Weight in decimal pounds"}
-        },
-        {
-            "type": "input",
-            "block_id": "input_c",
-            "label": {"type": "plain_text", "text": "Spicy Filets"},
-            "element": {
-                "type": "plain_text_input",
-                "action_id": "spicy",
-                "initial_value": "0"
-            },
-            "hint": {"type": "plain_text", "text": "Weight in decimal pounds"}
-        },
-        {
-            "type": "input",
-            "block_id": "input_d",
-            "label": {"type": "plain_text", "text": "Nuggets"},
-            "element": {
-                "type": "plain_text_input",
-                "action_id": "nuggets",
-                "initial_value": "0"
-            },
-            "hint": {"type": "plain_text", "text": "Weight in decimal pounds"}
-        },
-        {
-            "type": "input",
-            "block_id": "input_e",
-            "label": {"type": "plain_text", "text": "Strips"},
-            "element": {
-                "type": "plain_text_input",
-                "action_id": "strips",
-                "initial_value": "0"
-            },
-            "hint": {"type": "plain_text", "text": "Weight in decimal pounds"}
-        },
-        {
-            "type": "input",
-            "block_id": "input_f",
-            "label": {"type": "plain_text", "text": "Grilled Filets"},
-            "element": {
-                "type": "plain_text_input",
-                "action_id": "grilled1",
-                "initial_value": "0"
-            },
-            "hint": {"type": "plain_text", "text": "Weight in decimal pounds"}
-        },
-        {
-            "type": "input",
-            "block_id": "input_g",
-            "label": {"type": "plain_text", "text": "Grilled Nuggets"},
-            "element": {
-                "type": "plain_text_input",
-                "action_id": "grilled2",
-                "initial_value": "0"
-            },
-            "hint": {"type": "plain_text", "text": "Weight in decimal pounds"}
-        }
-    ]
+    leader_options = templates.options([leader.first_name for leader in await leader_directory.at("BOH")])
     # If it's before 1pm, include the breakfast meats as well.
-    if datetime.now().hour < 13:
-        blocks.append(
-            {
-                "type": "input",
-                "block_id": "input_h",
-                "label": {"type": "plain_text", "text": "Breakfast Filets"},
-                "element": {
-                    "type": "plain_text_input",
-                    "action_id": "breakfast",
-                    "initial_value": "0"
-                },
-                "hint": {"type": "plain_text", "text": "Weight in decimal pounds"}
-            }
-        )
-        blocks.append(
-            {
-                "type": "input",
-                "block_id": "input_k",
-                "label": {"type": "plain_text", "text": "Spicy Breakfast Filets"},
-                "element": {
-                    "type": "plain_text_input",
-                    "action_id": "spicy_breakfast",
-                    "initial_value": "0"
-                },
-                "hint": {"type": "plain_text", "text": "Weight in decimal pounds"}
-            }
-        )
-        blocks.append(
-            {
-                "type": "input",
-                "block_id": "input_i",
-                "label": {"type": "plain_text", "text": "Grilled Breakfast"},
-                "element": {
-                    "type": "plain_text_input",
-                    "action_id": "grilled3",
-                    "initial_value": "0"
-                },
-                "hint": {"type": "plain_text", "text": "Weight in decimal pounds"}
-            }
-        )
-    blocks.append(
-        {
-            "type": "input",
-            "block_id": "input_j",
-            "label": {"type": "plain_text", "text": "Additional Info"},
-            "element": {
-                "type": "plain_text_input",
-                "action_id": "other",
-                "multiline": True
-            },
-            "optional": True
-        }
-    )
-    blocks.append(
-        {
-            "type": "context",
-            "block_id": "context_a",
-            "elements": [
-                {
-                    "type": "plain_text",
-                    "text": body['container']['message_ts']
-                }
-            ]
-        }
-    )
-    logger.info("Blocks ready. Open view.")
+    template = modals.WASTE_REPORT_BREAKFAST if datetime.now().hour < 13 else modals.WASTE_REPORT
     try:
         await client.views_open(
             trigger_id=body['trigger_id'],
-            view={
-                "type": "modal",
-                "callback_id": "waste_view",
-                "title": {"type": "plain_text", "text": "Waste Form"},
-                "submit": {"type": "plain_text", "text": "Submit"},
-                "blocks": blocks
-            }
+            view=template.render(leaders=leader_options, message_ts=body['container']['message_ts'])
         )
     except Exception as e:
         logger.error(f"Error: {e}")
@@ -2952,13 +1970,8 @@ async def handle_waste_view(ack, body, client, view):
         to_post.append(g_breakfast)
         to_post.append(s_breakfast)
     # Send data to Google Sheet
-    sh = gc.open_by_key(creds.waste_id)
     try:
-        sheet = sh.worksheet("Data")
-        sheet.append_row(to_post, value_input_option='USER_ENTERED')
-    except gspread.exceptions.GSpreadException as e:
-        return await client.chat_postMessage(channel=body['user']['id'],
-                                             text=e)
+        await sheets.append_later(creds.waste_id, "Data", to_post, value_input_option='USER_ENTERED')
     except Exception as e:
         await client.chat_postMessage(channel=body['user']['id'],
                                       text=f"There was an error while storing the message to the Google Sheet.\n{e}")
@@ -2967,15 +1980,13 @@ async def handle_waste_view(ack, body, client, view):
         return
     chicken_list = [regulars, spicy, nuggets, strips, g_filets, g_nuggets]
     total_weight = sum(chicken_list)
-    goal_sheet = sh.worksheet("Goals")
-    goal_values = goal_sheet.get_all_values()
+    goal_values = await sheets.get_values(creds.waste_id, "Goals")
     goals = {}
     for row in goal_values:
         if row[0] == "Type":
             continue
         goals[row[0]] = float(row[1])
-    user = await client.users_info(user=body['user']['id'])
-    user_name = user['user']['real_name']
+    user_name = await profiles.real_name(client, body['user']['id'])
     new_line = "\n"
     block1 = {
         "type": "section",
@@ -3060,9 +2071,11 @@ async def handle_waste_view(ack, body, client, view):
         }
         blocks.append(block4)
     try:
-        sheet = sh.worksheet("Daily Totals")
+        # Daily Totals is calculated from Data, so make sure this report has actually landed there first
+        await sheets.flush(creds.waste_id, "Data")
+        sheet = await sheets.worksheet(creds.waste_id, "Daily Totals")
         # Filets, Spicy, Nuggets, Strips, Grilled Filets, Grilled Nuggets, Breakfast, Grilled B, Spicy B
-        daily_totals = sheet.get_all_values()
+        daily_totals = await sheets.call(sheet.get_all_values)
         if int(daily_totals[0][3]) > 1:
             content = "*Totals for today:*\n"
             totals = {}
@@ -3129,9 +2142,7 @@ async def waste_goals(ack, say):
     """Responds with the current daily waste goals from the Waste Tracking Google Sheet. These goals are calculated
     from averages in the Food Cost Report."""
     await ack()
-    sh = gc.open_by_key(creds.waste_id)
-    sheet = sh.worksheet("Goals")
-    values = sheet.get_all_values()
+    values = await sheets.get_values(creds.waste_id, "Goals")
     content = "*Daily Waste Goals:*\n"
     for row in values:
         if row[0] == "Type":
@@ -3235,20 +2246,15 @@ async def handle_sales_input(ack, body, client, view):
     transactions = view['state']['values']['input_d']['transaction_count']['value']
     labor_percent = view['state']['values']['input_e']['labor_percent']['value']
     labor_hours = view['state']['values']['input_f']['labor_hours']['value']
-    sh = gc.open_by_key(creds.sales_id)
-    sheet = sh.worksheet("Sales")
-    cell_list = sheet.findall(sales_date)
-    for cell in cell_list:
-        if cell.col == 1:
-            sheet.update_cell(cell.row, 5, transactions)
-            sheet.update_cell(cell.row, 6, sales_amount)
-            sheet.update_cell(cell.row, 7, cater_amount)
-            sheet.update_cell(cell.row, 10, float(labor_percent) / 100)
-            sheet.update_cell(cell.row, 11, labor_hours)
-            sheet.update_cell(cell.row, 8, f"=(F{cell.row}-G{cell.row})/E{cell.row}")
-            sheet.update_cell(cell.row, 9, f"=F{cell.row}*J{cell.row}")
-            sheet.update_cell(cell.row, 12, f"=I{cell.row}/K{cell.row}")
-            sheet.update_cell(cell.row, 13, f"=F{cell.row}/K{cell.row}")
+    # Fill in the row for this date (column A) in one write, including the calculated columns
+    to_post = {
+        5: transactions,
+        6: sales_amount,
+        7: cater_amount,
+        10: float(labor_percent) / 100,
+        11: labor_hours
+    }
+    await sheets.patch_row(creds.sales_id, "Sales", sales_date, to_post, SALES_FORMULAS)
     await client.chat_postMessage(channel=creds.test_channel,
                                   text="**Sales posted**")
 
@@ -3263,47 +2269,45 @@ async def find_names(ack, body, client):
     """
     await ack()
     fuzzy_number = 78
-    # Collect sick records
-    sh = gc.open_by_key(creds.sick_log_id)
-    sheet = sh.worksheet("Form Responses 1")
-    data = sheet.get_all_values()
-    count = 0
+    # The logs are read from the local mirror. This tops all three up from Google at the same time if they are
+    # more than a minute old.
+    await mirror.refresh("sick", "tardy", "discipline")
     input_name = body['text']
-    sick_text = f"*Absence records for {input_name}:*"
-    for row in data:
-        ratio = fuzz.token_sort_ratio(input_name.lower(), row[1].lower())
-        if ratio > fuzzy_number:
-            count += 1
-            sick_text += f"\n{row[0]} - {row[2]}"
-            if row[3]:
-                sick_text += f" ({row[3]})"
-            logger.info(f"Sick - {row[1]} matches {input_name}")
-    if count == 0:
-        sick_text = f"No absences found for {input_name}."
+    # Every spelling on the logs is registered with an ID, then the records are looked up by ID. Everyone who
+    # scores above fuzzy_number is included, like matching the names row by row would. That's only for this
+    # lookup, close names are never saved as the same person.
+    await team.rebuild()
+    team.learn_from_mirror()
+    tm_ids = team.find_all(input_name, fuzzy_number)
+    if not tm_ids:
+        return await client.chat_postEphemeral(channel=body['channel_id'],
+                                               user=body['user_id'],
+                                               text=f"No team members match {input_name}. Please try again.")
+    # Name everyone whose records are included, not just the closest match
+    tm_name = ", ".join(team.name(tm_id) for tm_id in tm_ids)
+    # Collect sick records
+    rows = team.log_rows("sick", tm_ids)
+    sick_text = f"*Absence records for {tm_name}:*"
+    for row in rows:
+        sick_text += f"\n{row[0]} - {row[2]}"
+        if row[3]:
+            sick_text += f" ({row[3]})"
+    if not rows:
+        sick_text = f"No absences found for {tm_name}."
     # Collect tardies
-    sheet = sh.worksheet("Tardy Import")
-    data = sheet.get_all_values()
-    count = 0
-    tardy_text = f"*Tardy records for {input_name}:*"
-    for row in data:
-        ratio = fuzz.token_sort_ratio(input_name.lower(), row[0].lower())
-        if ratio > fuzzy_number:
-            count += 1
-            tardy_text += f"\nTardy on {row[1]}"
-    if count == 0:
-        tardy_text = f"No tardies found for {input_name}"
+    rows = team.log_rows("tardy", tm_ids)
+    tardy_text = f"*Tardy records for {tm_name}:*"
+    for row in rows:
+        tardy_text += f"\nTardy on {row[1]}"
+    if not rows:
+        tardy_text = f"No tardies found for {tm_name}"
     # Collect Discipline
-    sheet = sh.worksheet("Discipline")
-    data = sheet.get_all_values()
-    count = 0
-    disc_text = f"*Discipline records for {input_name}*"
-    for row in data:
-        ratio = fuzz.token_sort_ratio(input_name.lower(), row[1].lower())
-        if ratio > fuzzy_number:
-            count += 1
-            disc_text += f"\n{row[0]} - ({row[2]}) {row[3]}"
-    if count == 0:
-        disc_text = f"No discpline found for {input_name}."
+    rows = team.log_rows("discipline", tm_ids)
+    disc_text = f"*Discipline records for {tm_name}*"
+    for row in rows:
+        disc_text += f"\n{row[0]} - ({row[2]}) {row[3]}"
+    if not rows:
+        disc_text = f"No discpline found for {tm_name}."
     blocks = [
         {
             "type": "section",
@@ -3356,11 +2360,7 @@ async def bot_test(ack, body, client):
     await ack()
     tm_name = body['text']
     fuzzy_num = 70
-    # Collect TM names from Staff Sheet
-    sh = gc.open_by_key(creds.staff_id)
-    sheet = sh.worksheet("Staff")
-    data = sheet.col_values(1)
-    name_options = process.extractBests(tm_name, data, limit=5)
+    name_options = await match_staff(tm_name)
     if not name_options:
         return await client.chat_postEphemeral(channel=body['channel_id'],
                                                user=body['user_id'],
@@ -3392,8 +2392,38 @@ async def bot_test(ack, body, client):
                                     text="Name options for tardy selection.")
 
 
+async def report_lost_rows(name, rows, error):
+    """Called by sheets.flush when queued rows can't be written and have been moved to the dead letter file"""
+    await client.chat_postMessage(channel=creds.pj_user_id,
+                                  text=f"{len(rows)} row(s) for {name} couldn't be written to the Google Sheet "
+                                       f"and were saved to {sheets.DEAD_LETTER_FILE} instead.\n{error}")
+
+
+async def start_background_tasks(web_app):
+    """Runs once the web server's event loop is up"""
+    sheets.set_failure_handler(report_lost_rows)
+    sheets.start_flusher()
+    mirror.start()
+    # Before anything stamps a new ID, if team.db is missing
+    await team.rebuild()
+    web_app['profiles'] = asyncio.get_running_loop().create_task(profiles.warm(client))
+    web_app['home_views'] = asyncio.get_running_loop().create_task(home_view_loop())
+
+
+async def stop_background_tasks(web_app):
+    """Let background jobs finish and send anything still queued for Google Sheets before shutting down"""
+    web_app['home_views'].cancel()
+    await jobs.drain()
+    await sheets.flush()
+    await http_client.close()
+
+
 # Start your app
 if __name__ == "__main__":
-    app.start(port=int(os.environ.get("PORT", 3000)))
+    port = int(os.environ.get("PORT", 3000))
+    web_app = app.web_app(port=port)
+    web_app.on_startup.append(start_background_tasks)
+    web_app.on_cleanup.append(stop_background_tasks)
+    web.run_app(web_app, port=port)
     # while True:
     #     asyncio.run(cem_poster())
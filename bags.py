@@ -0,0 +1,116 @@
+# TMS bag tracking for the /tms command.
+# The TMS sheet has one row per bag: bag number, date out, driver, business, contact name, contact phone.
+# Instead of searching the sheet every time someone clicks a button, the bags are loaded once into memory
+# and every check out/check in is one range write to the bag's row, after reading column A of that row to make
+# sure the bag is still there.
+import asyncio
+import sheets
+import time
+
+from loguru import logger
+
+# Bags can still be edited by hand in the sheet, so reload it every so often to pick those changes up.
+RELOAD_SECONDS = 10 * 60
+
+
+class Bag:
+    def __init__(self, number, row, date_out="", driver="", location="", contact_name="", contact_number=""):
+        self.number = number
+        self.row = row
+        self.date_out = date_out
+        self.driver = driver
+        self.location = location
+        self.contact_name = contact_name
+        self.contact_number = contact_number
+
+    @property
+    def checked_out(self):
+        return bool(self.driver)
+
+
+class BagInventory:
+    def __init__(self, key, name=0):
+        self.key = key
+        self.name = name
+        self.bags = {}
+        self.loaded_at = None
+        self._lock = asyncio.Lock()
+
+    async def load(self, force=False):
+        """Read the TMS sheet into memory. Does nothing if it was loaded recently, unless force is True."""
+        async with self._lock:
+            if not force and self.loaded_at and time.monotonic() - self.loaded_at < RELOAD_SECONDS:
+                return
+            ws = await sheets.worksheet(self.key, self.name)
+            values = await sheets.call(ws.get_all_values)
+            bags = {}
+            # Row 1 is the header
+            for row_num, row in enumerate(values[1:], start=2):
+                if not row or not row[0]:
+                    continue
+                row = row + [""] * (6 - len(row))
+                bags[row[0]] = Bag(row[0], row_num, *row[1:6])
+            self.bags = bags
+            self.loaded_at = time.monotonic()
+
+    async def available(self):
+        """Bags that are in the store"""
+        await self.load()
+        return [bag for bag in self.bags.values() if not bag.checked_out]
+
+    async def checked_out(self):
+        """Bags that are out with a driver"""
+        await self.load()
+        return [bag for bag in self.bags.values() if bag.checked_out]
+
+    async def _get(self, number):
+        await self.load()
+        if number not in self.bags:
+            # Somebody may have added the bag to the sheet by hand since we last looked
+            await self.load(force=True)
+        return self.bags[number]
+
+    async def _checked(self, ws, number):
+        """The bag, after checking that its row on the sheet still has it in column A. Rows can be inserted or
+        sorted by hand, so if it moved, read the sheet again and use where it is now."""
+        bag = await self._get(number)
+        if await self._number_on(ws, bag.row) == number:
+            return bag
+        logger.info(f"TMS Bag #{number} isn't on row {bag.row} anymore, reloading the sheet")
+        await self.load(force=True)
+        bag = self.bags.get(number)
+        if bag is None or await self._number_on(ws, bag.row) != number:
+            raise ValueError(f"TMS Bag #{number} isn't where the sheet said it was. Please try again.")
+        return bag
+
+    async def _number_on(self, ws, row_num):
+        values = await sheets.call(ws.get, f"A{row_num}")
+        return values[0][0] if values and values[0] else ""
+
+    async def check_out(self, number, date_out, driver, location, contact_name, contact_number):
+        """Mark a bag as checked out, both here and in the sheet (one write to B:F of the bag's row)"""
+        fields = [date_out, driver, location, contact_name, contact_number]
+        ws = await sheets.worksheet(self.key, self.name)
+        bag = await self._checked(ws, number)
+        try:
+            await sheets.call(ws.update, range_name=f"B{bag.row}:F{bag.row}", values=[fields])
+        except Exception:
+            # We don't know what made it to the sheet, so start over from the sheet next time
+            self.loaded_at = None
+            raise
+        bag.date_out, bag.driver, bag.location, bag.contact_name, bag.contact_number = fields
+        logger.info(f"TMS Bag #{number} checked out by {driver}")
+        return bag
+
+    async def check_in(self, number):
+        """Mark a bag as returned, both here and in the sheet (one clear of B:F of the bag's row)"""
+        ws = await sheets.worksheet(self.key, self.name)
+        bag = await self._checked(ws, number)
+        try:
+            await sheets.call(ws.batch_clear, [f"B{bag.row}:F{bag.row}"])
+        except Exception:
+            self.loaded_at = None
+            raise
+        bag.date_out = bag.driver = bag.location = bag.contact_name = bag.contact_number = ""
+        logger.info(f"TMS Bag #{number} checked in")
+        return bag
@@ -1,5 +1,6 @@
 import creds
 import gspread
+import quota
 import requests
 
 from datetime import datetime, timedelta
@@ -8,9 +9,9 @@ from datetime import datetime, timedelta
 
 # Connect to Google Sheets
 gc = gspread.service_account(filename=creds.gspread)
-spreadsheet = gc.open_by_key(creds.card_id)
-sheet = spreadsheet.get_worksheet(0)
-sheet.sort((3, "asc"), range="A2:C200")
+spreadsheet = quota.call(gc.open_by_key, creds.card_id)
+sheet = quota.call(spreadsheet.get_worksheet, 0)
+quota.call(sheet.sort, (3, "asc"), range="A2:C200")
 
 now_str = datetime.today().strftime("%m/%d/%Y")
 now = datetime.today()
@@ -20,7 +21,7 @@ webhook_url = creds.webhook_all
 
 def main():
     """Notifications for soon to expire food handlers cards"""
-    data = sheet.get_all_values()
+    data = quota.call(sheet.get_all_values)
     about_to_expire = {}
     already_expired = {}
     for row in data[1:]:
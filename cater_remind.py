@@ -1,46 +1,44 @@
 import creds
 import gspread
+import orderbook
+import quota
 import requests
 import sys
 
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
 from loguru import logger
 
 # Connect to Google Sheets
 gc = gspread.service_account(filename=creds.gspread)
-spreadsheet = gc.open_by_key(creds.cater_id)
-sheet1 = spreadsheet.worksheet("Sheet1")
-sheet2 = spreadsheet.worksheet("Sheet2")
+spreadsheet = quota.call(gc.open_by_key, creds.cater_id)
+sheet1 = quota.call(spreadsheet.worksheet, "Sheet1")
+sheet2 = quota.call(spreadsheet.worksheet, "Sheet2")
+# Every order in one read, indexed by date
+orders = orderbook.OrderBook(quota.call(sheet1.get_values, "A2:F"))
+drivers = {}
 
-now_str = datetime.today().strftime("%m/%d/%Y")
 now = datetime.today()
 logger.info(f"Today is set as {now}.")
-then = datetime.today() + timedelta(days=7)
 maps_url_base = "https://www.google.com/maps/search/?api=1&query="
 webhook_url = creds.webhook_cater
 
 
 def get_driver(driver_name):
-    driver_list = sheet2.get_all_values()
-    for driver in driver_list:
-        if driver[0] == driver_name:
-            driver_tag = f"<@{driver[1]}>"
-            break
-    else:
-        driver_tag = driver_name
-    return driver_tag
+    if not drivers:
+        # read the driver list once, not once per order
+        for driver in quota.call(sheet2.get_all_values):
+            drivers.setdefault(driver[0], f"<@{driver[1]}>")
+    return drivers.get(driver_name, driver_name)
 
 
 def morning():
     """Notification of catering orders for each day (details)"""
-    list_of_orders = sheet1.findall(now_str, in_column=1)
+    list_of_orders = orders.on(date.today())
     if not list_of_orders:
         # no catering orders for this day
         return
-    list_of_rows = [x.row for x in list_of_orders]
     blocks = []
-    for row in list_of_rows:
-        values_list = sheet1.row_values(row)
+    for _, values_list in list_of_orders:
         if values_list[2] == "ADP":
             driver_tag = get_driver(values_list[3].strip())
             blocks.append(
@@ -159,7 +157,7 @@ def morning():
 
 def evening():
     """Notification of catering orders for upcoming days (summary)"""
-    list_of_rows = sheet1.get_values("A2:F")
+    list_of_rows = orders.between(date.today() + timedelta(days=1), date.today() + timedelta(days=7))
     list_of_deliveries = []
     blocks = [
         {
@@ -167,8 +165,8 @@ def evening():
             "text": {"type": "plain_text", "text": "Upcoming Catering Orders"}
         }
     ]
-    for row in list_of_rows:
-        if now < datetime.strptime(row[0], "%m/%d/%Y") < then and row[2] != "PICKUP":
+    for _, row in list_of_rows:
+        if row[2] != "PICKUP":
             if row[2] == "ADP":
                 driver_tag = get_driver(row[3].strip())
             else:
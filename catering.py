@@ -0,0 +1,148 @@
+# The catering order sheet used by /cater, the Home tab and cater_remind.py.
+# Sheet1 has a header row and then one row per order: date, time, driver (or PICKUP/ADP), guest, address, phone,
+# kept in date and time order. Orders are kept in memory too, so a new order can be inserted right where it
+# belongs instead of appending it and re-sorting the whole sheet, and questions like "what are Jon's orders
+# today" never touch Google. Orders from past days are moved to the Archive tab in batches so Sheet1 stays short.
+import asyncio
+import gspread
+import orderbook
+import sheets
+import time
+
+from bisect import bisect_right
+from datetime import date
+from loguru import logger
+
+# Orders can still be added or fixed by hand in the sheet, so reload it every so often to pick those up.
+RELOAD_SECONDS = 10 * 60
+# Past orders are only moved once at least this many have piled up, so archiving is one write every few days
+ARCHIVE_BATCH = 25
+ARCHIVE_TAB = "Archive"
+
+
+class CateringOrders:
+    def __init__(self, key, name="Sheet1", archive=ARCHIVE_TAB):
+        self.key = key
+        self.name = name
+        self.archive = archive
+        self.book = orderbook.OrderBook([])
+        # bumped whenever the orders change, so anything built from them knows to rebuild
+        self.version = 0
+        self.loaded_at = None
+        self._lock = asyncio.Lock()
+
+    def _replace(self, rows):
+        rows = [row + [""] * (orderbook.COLUMNS - len(row)) for row in rows]
+        if rows != self.book.rows:
+            self.book = orderbook.OrderBook(rows)
+            self.version += 1
+
+    async def _load(self, force=False):
+        if not force and self.loaded_at and time.monotonic() - self.loaded_at < RELOAD_SECONDS:
+            return
+        ws = await sheets.worksheet(self.key, self.name)
+        self._replace(await sheets.call(ws.get_values, "A2:F"))
+        self.loaded_at = time.monotonic()
+
+    async def orders(self):
+        """The current OrderBook, reloaded from the sheet if it's been a while"""
+        async with self._lock:
+            await self._load()
+            return self.book
+
+    async def upcoming(self):
+        """(sheet row, values) for every order after today"""
+        book = await self.orders()
+        return book.between(date.fromordinal(date.today().toordinal() + 1), date.max)
+
+    async def add(self, row):
+        """Insert an order at its place in date and time order and return the sheet row it landed on"""
+        async with self._lock:
+            await self._load()
+            position = bisect_right(self.book.keys, orderbook.sort_key(row))
+            ws = await sheets.worksheet(self.key, self.name)
+            try:
+                await sheets.call(ws.insert_row, row, index=position + 2, value_input_option="USER_ENTERED",
+                                  idempotent=False)
+            except Exception:
+                # We don't know what made it to the sheet, so start over from the sheet next time
+                self.loaded_at = None
+                raise
+            rows = list(self.book.rows)
+            rows.insert(position, row)
+            self._replace(rows)
+            return position + 2
+
+    async def remove(self, row_num, order):
+        """Delete an order. row_num is where it was when the modal opened and order is its fingerprint(). Rows
+        can move in the meantime (a new order, an archive, an edit by hand), so the row is checked first and
+        the order is looked up again if it moved. Returns the row that was deleted, or None if the order is
+        gone."""
+        async with self._lock:
+            ws = await sheets.worksheet(self.key, self.name)
+            if orderbook.fingerprint(await sheets.call(ws.row_values, row_num)) != order:
+                await self._load(force=True)
+                positions = [i for i, row in enumerate(self.book.rows) if orderbook.fingerprint(row) == order]
+                if not positions:
+                    return None
+                row_num = positions[0] + 2
+            try:
+                await sheets.call(ws.delete_rows, row_num, idempotent=False)
+            except Exception:
+                self.loaded_at = None
+                raise
+            position = row_num - 2
+            rows = self.book.rows
+            if self.loaded_at and position < len(rows) and orderbook.fingerprint(rows[position]) == order:
+                self._replace(rows[:position] + rows[position + 1:])
+            else:
+                # our copy doesn't match the sheet, read it again next time
+                self.loaded_at = None
+            return row_num
+
+    async def archive_past(self, minimum=ARCHIVE_BATCH):
+        """Move orders from before today to the archive tab, once at least minimum of them are waiting.
+        Since the sheet is in date order they are all at the top, so this is one append and one delete. Rows
+        typed in by hand can be out of order, so only the run of past orders at the very top is moved."""
+        async with self._lock:
+            # Deleting from a stale copy could take a new order with it, so always start from the sheet
+            await self._load(force=True)
+            today = date.today()
+            count = next((i for i, key in enumerate(self.book.keys) if key[0] >= today), len(self.book.keys))
+            if count == 0 or count < minimum:
+                return 0
+            ws = await sheets.worksheet(self.key, self.name)
+            fetched = await sheets.call(ws.get_values, f"A2:F{count + 1}")
+            # Check the dates again on what we are about to delete, and stop at the first one that isn't past
+            past = []
+            for row in fetched:
+                day = orderbook.order_date(row) if row else None
+                if day is None or day >= today:
+                    break
+                past.append(row)
+            count = len(past)
+            if count == 0:
+                return 0
+            archive = await self._archive_sheet()
+            await sheets.call(archive.append_rows, past, value_input_option="USER_ENTERED", idempotent=False)
+            try:
+                await sheets.call(ws.delete_rows, 2, count + 1, idempotent=False)
+            except Exception:
+                logger.exception(f"Archived {count} catering order(s) but couldn't remove them from {self.name}. "
+                                 f"They are now in both tabs.\n")
+                self.loaded_at = None
+                raise
+            self._replace(self.book.rows[count:])
+            logger.info(f"Moved {count} past catering order(s) to {self.archive}")
+            return count
+
+    async def _archive_sheet(self):
+        try:
+            return await sheets.worksheet(self.key, self.archive)
+        except gspread.exceptions.WorksheetNotFound:
+            spreadsheet = await sheets.spreadsheet(self.key)
+            archive = await sheets.call(spreadsheet.add_worksheet, title=self.archive, rows=1000,
+                                        cols=orderbook.COLUMNS, idempotent=False)
+            await sheets.call(archive.append_row, ["Date", "Time", "Driver", "Guest", "Address", "Phone"],
+                              idempotent=False)
+            return archive
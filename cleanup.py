@@ -0,0 +1,82 @@
+# Bulk message deletion for /clear.
+# Slack only lets us delete one message per call and chat.delete is a Tier 3 method (about 50 calls a minute),
+# so clearing a busy channel takes a while. Messages are read a page at a time and deleted a few at once.
+# Pacing and 429s are handled by the bot's client (see slack_api.py), so pass it that one. Where we got to is
+# saved after every page so a clear that gets interrupted (restart, crash) can pick up where it left off.
+import asyncio
+import json
+import os
+import time
+
+from loguru import logger
+from slack_sdk.errors import SlackApiError
+
+STATE_FILE = "clear_state.json"
+PAGE_SIZE = 100
+# Deletes in flight at once
+CONCURRENCY = 3
+
+
+def _load_state():
+    if not os.path.exists(STATE_FILE):
+        return {}
+    with open(STATE_FILE) as f:
+        try:
+            return json.load(f)
+        except ValueError:
+            return {}
+
+
+def _save_state(state):
+    tmp_file = STATE_FILE + ".tmp"
+    with open(tmp_file, "w") as f:
+        json.dump(state, f)
+    os.replace(tmp_file, STATE_FILE)
+
+
+def unfinished(channel):
+    """The saved state of an interrupted clear in this channel, or None"""
+    return _load_state().get(channel)
+
+
+async def clear_channel(client, channel, count, token, progress=None, resume=False):
+    """Delete the newest count messages in a channel. progress, if given, is awaited after every page with
+    (messages deleted, messages looked at, count). With resume=True an interrupted clear of this channel
+    carries on instead (count is ignored then). Returns the number of messages deleted."""
+    job = unfinished(channel) if resume else None
+    if job is None:
+        # Only messages from before we started, so progress messages and anything new are left alone
+        job = {"count": count, "done": 0, "deleted": 0, "latest": f"{time.time():.6f}"}
+    semaphore = asyncio.Semaphore(CONCURRENCY)
+
+    async def delete(ts):
+        async with semaphore:
+            try:
+                await client.chat_delete(channel=channel, ts=ts, token=token)
+                return True
+            except SlackApiError as e:
+                logger.warning(f"Couldn't delete message {ts} in {channel}: {e.response['error']}")
+                return False
+
+    while job['done'] < job['count']:
+        # Page by timestamp rather than cursor, since the messages we delete drop out of the history under us
+        page = await client.conversations_history(channel=channel, latest=job['latest'],
+                                                  limit=min(PAGE_SIZE, job['count'] - job['done']))
+        messages = page['messages']
+        if not messages:
+            break
+        results = await asyncio.gather(*[delete(message['ts']) for message in messages])
+        job['done'] += len(messages)
+        job['deleted'] += sum(results)
+        job['latest'] = messages[-1]['ts']
+        # read it again in case another channel is being cleared at the same time
+        state = _load_state()
+        state[channel] = job
+        _save_state(state)
+        if progress:
+            await progress(job['deleted'], job['done'], job['count'])
+    state = _load_state()
+    state.pop(channel, None)
+    _save_state(state)
+    logger.info(f"Cleared {job['deleted']} message(s) from {channel}")
+    return job['deleted']
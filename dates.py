@@ -0,0 +1,29 @@
+# Reading the dates and times people type into the sheets.
+# They show up in a handful of formats depending on who typed them and whether a form or the bot wrote them.
+# Everything that needs to read one goes through here, so a cell is either a date everywhere or nowhere.
+from datetime import datetime
+
+DATE_FORMATS = ["%m/%d/%Y", "%Y-%m-%d", "%Y-%m-%d %H:%M:%S", "%Y-%m-%d %H:%M:%S.%f", "%m/%d/%Y %H:%M:%S"]
+TIME_FORMATS = ["%H:%M", "%I:%M %p", "%H:%M:%S", "%I:%M:%S %p"]
+
+
+def parse(text, formats=DATE_FORMATS):
+    """text as a datetime, trying each format in order, or None if none of them fit"""
+    for fmt in formats:
+        try:
+            return datetime.strptime(text.strip(), fmt)
+        except ValueError:
+            pass
+    return None
+
+
+def parse_date(text):
+    """text as a date, or None if it isn't one"""
+    parsed = parse(text)
+    return parsed.date() if parsed else None
+
+
+def parse_time(text):
+    """text as a time of day, or None if it isn't one"""
+    parsed = parse(text, TIME_FORMATS)
+    return parsed.time() if parsed else None
@@ -0,0 +1,87 @@
+# Outbound HTTP from the bot (Slack webhooks, Trello and so on).
+# requests would block the event loop and opens a new connection for every call. Everything here goes through
+# one shared aiohttp session instead, which keeps connections open between calls, has timeouts, and retries
+# rate limits and server hiccups.
+import aiohttp
+import asyncio
+import json
+import random
+
+from loguru import logger
+from urllib.parse import urlsplit
+
+TIMEOUT = aiohttp.ClientTimeout(total=15, connect=5)
+# Open connections overall and to any one host
+LIMIT = 20
+LIMIT_PER_HOST = 5
+MAX_RETRIES = 3
+BASE_BACKOFF = 1
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+_session = None
+
+
+class Response:
+    def __init__(self, status_code, text, headers):
+        self.status_code = status_code
+        self.text = text
+        self.headers = headers
+
+    def json(self):
+        return json.loads(self.text)
+
+
+def session():
+    """The shared ClientSession, created on first use (it has to be made inside the running event loop)"""
+    global _session
+    if _session is None or _session.closed:
+        connector = aiohttp.TCPConnector(limit=LIMIT, limit_per_host=LIMIT_PER_HOST)
+        _session = aiohttp.ClientSession(timeout=TIMEOUT, connector=connector)
+    return _session
+
+
+async def request(method, url, idempotent=True, **kwargs):
+    """Send a request and return a Response with status_code, text and json(), a lot like requests does.
+
+    429s are always retried since the server didn't act on them. Server errors and dropped connections are
+    only retried when idempotent is True. Pass idempotent=False for calls like "create a Trello card" where
+    a second try could make a second card.
+
+    Example usage:
+    r = await http_client.request("POST", creds.webhook_test, json=payload)
+    """
+    # only the host goes in the log, webhook URLs have their secret in the path
+    host = urlsplit(url).netloc
+    for attempt in range(MAX_RETRIES + 1):
+        delay = BASE_BACKOFF * 2 ** attempt
+        delay = delay / 2 + random.uniform(0, delay / 2)
+        try:
+            async with session().request(method, url, **kwargs) as r:
+                response = Response(r.status, await r.text(), r.headers)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            if not idempotent or attempt == MAX_RETRIES:
+                raise
+            logger.warning(f"{method} to {host} failed ({e!r}), retrying in {delay:.1f}s")
+            await asyncio.sleep(delay)
+            continue
+        retry = response.status_code == 429 or (idempotent and response.status_code in RETRY_STATUSES)
+        if not retry or attempt == MAX_RETRIES:
+            return response
+        if "Retry-After" in response.headers:
+            delay = float(response.headers['Retry-After'])
+        logger.warning(f"{method} to {host} returned {response.status_code}, retrying in {delay:.1f}s")
+        await asyncio.sleep(delay)
+
+
+async def post(url, **kwargs):
+    return await request("POST", url, **kwargs)
+
+
+async def get(url, **kwargs):
+    return await request("GET", url, **kwargs)
+
+
+async def close():
+    """Close the shared session. Call this on shutdown."""
+    if _session is not None and not _session.closed:
+        await _session.close()
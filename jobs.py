@@ -0,0 +1,83 @@
+# Background jobs for view submissions.
+# Slack gives us 3 seconds to ack a submission, and if we're late it shows "We had some trouble connecting" and
+# sends the submission again, so the work gets done twice. View handlers should only read and check the form,
+# then hand the slow part (Sheets, Trello, users_info and so on) to dispatch(), which acks right away and runs it
+# as a background job. A job that fails tells the user (and me) instead of just ending up in the log.
+import asyncio
+import creds
+import itertools
+import time
+
+from loguru import logger
+
+# How long a shutdown waits for running jobs
+DRAIN_SECONDS = 30
+
+_ids = itertools.count(1)
+# job id -> Job, for jobs that haven't finished yet
+_running = {}
+
+
+class Job:
+    def __init__(self, name, user_id):
+        self.id = next(_ids)
+        self.name = name
+        self.user_id = user_id
+        self.started = time.monotonic()
+        self.task = None
+
+
+async def _run(job, work, client, done):
+    try:
+        await work()
+    except Exception as e:
+        logger.exception(f"Job {job.id} ({job.name}) failed")
+        text = f"There was an error while {job.name}.\n{e}"
+        try:
+            await client.chat_postMessage(channel=job.user_id, text=text)
+            if job.user_id != creds.pj_user_id:
+                await client.chat_postMessage(channel=creds.pj_user_id, text=text)
+        except Exception:
+            logger.exception(f"Couldn't report the failure of job {job.id}")
+        return
+    finally:
+        _running.pop(job.id, None)
+    logger.info(f"Job {job.id} ({job.name}) finished in {time.monotonic() - job.started:.1f}s")
+    if done:
+        await client.chat_postMessage(channel=job.user_id, text=done)
+
+
+def spawn(work, client, user_id, name, done=None):
+    """Run work (an async function taking no arguments) in the background. name finishes the sentence
+    "There was an error while ..." that the user gets if it fails. done, if given, is sent to them when it
+    finishes. Returns the Job."""
+    job = Job(name, user_id)
+    job.task = asyncio.create_task(_run(job, work, client, done))
+    _running[job.id] = job
+    return job
+
+
+async def dispatch(ack, work, client, user_id, name, errors=None, done=None):
+    """Ack a view submission and run the rest of it as a background job. errors is the usual dict of block_id ->
+    message from checking the form. If there are any, they are shown in the modal and nothing runs.
+
+    Example usage:
+    await jobs.dispatch(ack, check_in, client, body['user']['id'], "checking in a TMS bag")
+    """
+    if errors:
+        return await ack(response_action="errors", errors=errors)
+    await ack()
+    return spawn(work, client, user_id, name, done)
+
+
+def running():
+    """Jobs that haven't finished yet"""
+    return list(_running.values())
+
+
+async def drain(timeout=DRAIN_SECONDS):
+    """Wait for running jobs to finish, e.g. on shutdown"""
+    tasks = [job.task for job in _running.values()]
+    if tasks:
+        logger.info(f"Waiting for {len(tasks)} background job(s)")
+        await asyncio.wait(tasks, timeout=timeout)
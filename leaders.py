@@ -0,0 +1,56 @@
+# Who our leaders are, looked up by Slack user ID.
+# The Leaders tab has a row per leader with their first name in column A, their Slack user ID in column B and
+# FOH/BOH in column E. The tab is read through the reference cache and turned into a dict keyed by Slack ID,
+# which is only rebuilt when the cached values change.
+import creds
+import sheets
+
+FIRST_NAME_COL = 0
+SLACK_ID_COL = 1
+LOCATION_COL = 4
+# The only people allowed to use admin commands like /clear
+ADMIN_IDS = (creds.pj_user_id, creds.hc_user_id, creds.jc_user_id, creds.pr_user_id, creds.jg_user_id)
+
+
+def _cell(row, col):
+    return row[col].strip() if len(row) > col else ""
+
+
+class Leader:
+    def __init__(self, row):
+        self.row = row
+        self.first_name = row[FIRST_NAME_COL]
+        self.slack_id = _cell(row, SLACK_ID_COL)
+        self.location = _cell(row, LOCATION_COL)
+
+
+class LeaderDirectory:
+    def __init__(self, key=creds.staff_id, name="Leaders"):
+        self.key = key
+        self.name = name
+        self.leaders = []
+        self.by_id = {}
+        self._values = None
+
+    async def load(self):
+        """Rebuild the directory if the Leaders tab changed since the last time"""
+        values = await sheets.get_values(self.key, self.name)
+        if values is self._values:
+            return
+        self.leaders = [Leader(row) for row in values if row and row[FIRST_NAME_COL]]
+        self.by_id = {leader.slack_id: leader for leader in self.leaders if leader.slack_id}
+        self._values = values
+
+    async def get(self, slack_id):
+        """The Leader with this Slack user ID, or None if they aren't on the Leaders tab"""
+        await self.load()
+        return self.by_id.get(slack_id)
+
+    async def all(self):
+        await self.load()
+        return self.leaders
+
+    async def at(self, location):
+        """Leaders who work in a location (FOH or BOH)"""
+        await self.load()
+        return [leader for leader in self.leaders if leader.location == location]
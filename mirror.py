@@ -0,0 +1,245 @@
+# A local SQLite copy of the worksheets the bot reads the most.
+# A background task keeps mirror.db in step with Google Sheets and handlers read from it instead of asking
+# Google every time. Because it lives on disk, it also keeps things like /find and the staff lists working
+# when Google is having a bad day (or right after a restart while Google is down). The staff lists aren't
+# synced on their own, they are just saved whenever sheets.get_values() reads them anyway.
+import asyncio
+import creds
+import dates
+import json
+import sheets
+import sqlite3
+import time
+
+from loguru import logger
+
+MIRROR_FILE = "mirror.db"
+SYNC_SECONDS = 2 * 60
+# Append only tabs are synced by just reading the new rows at the bottom. Every so often read the whole tab
+# anyway in case somebody fixed an old row by hand.
+FULL_SYNC_SECONDS = 6 * 60 * 60
+
+
+class Table:
+    def __init__(self, key, name, columns, append_only=False, synced=True):
+        """columns maps a column name in the mirror to its position (0 based) on the sheet. Those are the
+        columns you can search on, and each one gets an index. A column called date is stored as YYYY-MM-DD.
+        Tables with synced=False are never read from Google just for the mirror. They are only kept as a
+        fallback copy of whatever get_values() last read."""
+        self.key = key
+        self.name = name
+        self.columns = columns
+        self.append_only = append_only
+        self.synced = synced
+
+
+TABLES = {
+    "staff": Table(creds.staff_id, "Staff", {"name": 0}, synced=False),
+    "leaders": Table(creds.staff_id, "Leaders", {"name": 0, "location": 4}, synced=False),
+    # tm_id is the team member ID from team.py that the bot stamps on the end of each new row
+    "sick": Table(creds.sick_log_id, "Form Responses 1", {"date": 0, "name": 1, "tm_id": 6}, append_only=True),
+    "tardy": Table(creds.sick_log_id, "Tardy Import", {"name": 0, "date": 1, "tm_id": 2}, append_only=True),
+    "discipline": Table(creds.sick_log_id, "Discipline", {"date": 0, "name": 1, "tm_id": 7}, append_only=True),
+}
+
+db = sqlite3.connect(MIRROR_FILE)
+_sync_task = None
+_locks = {table: asyncio.Lock() for table in TABLES}
+# table -> [times the table changed, the change count as of the last change that wasn't just new rows at the
+# bottom]. Lets something built on top of a table (like the /find index) tell whether it can just read the
+# new rows or has to start over.
+_versions = {table: [0, 0] for table in TABLES}
+
+
+def _create_tables():
+    with db:
+        db.execute("CREATE TABLE IF NOT EXISTS sync_state "
+                   "(table_name TEXT PRIMARY KEY, synced_rows INTEGER, synced_at REAL, full_sync_at REAL)")
+        for table_name, table in TABLES.items():
+            existing = [row[1] for row in db.execute(f"PRAGMA table_info({table_name})")]
+            if existing and existing[2:] != list(table.columns):
+                # The indexed columns changed. It's only a copy, so drop it and let the next sync fill it back in.
+                db.execute(f"DROP TABLE {table_name}")
+                db.execute("DELETE FROM sync_state WHERE table_name = ?", [table_name])
+            columns = "".join(f", {column} TEXT COLLATE NOCASE" for column in table.columns)
+            db.execute(f"CREATE TABLE IF NOT EXISTS {table_name} (row INTEGER PRIMARY KEY, data TEXT NOT NULL{columns})")
+            for column in table.columns:
+                db.execute(f"CREATE INDEX IF NOT EXISTS {table_name}_{column} ON {table_name} ({column})")
+
+
+def to_date(text):
+    """Convert a date from the sheets to YYYY-MM-DD so they sort properly. Anything that doesn't look like a
+    date is left alone."""
+    parsed = dates.parse_date(text)
+    return parsed.isoformat() if parsed else text
+
+
+def _trim(row):
+    # get_all_values pads every row to the same width and get() doesn't, so compare rows without the padding
+    row = list(row)
+    while row and row[-1] == "":
+        row.pop()
+    return row
+
+
+def _record(table, row_num, values):
+    record = [row_num, json.dumps(_trim(values))]
+    for column, position in table.columns.items():
+        value = values[position].strip() if position < len(values) else ""
+        record.append(to_date(value) if column == "date" else value)
+    return record
+
+
+def _state(table_name):
+    state = db.execute("SELECT synced_rows, synced_at, full_sync_at FROM sync_state WHERE table_name = ?",
+                       [table_name]).fetchone()
+    return state or (0, 0, 0)
+
+
+def _save_state(table_name, synced_rows, full=False):
+    now = time.time()
+    full_sync_at = now if full else _state(table_name)[2]
+    db.execute("INSERT OR REPLACE INTO sync_state (table_name, synced_rows, synced_at, full_sync_at) "
+               "VALUES (?, ?, ?, ?)", [table_name, synced_rows, now, full_sync_at])
+
+
+def _store(table_name, start_row, values, full):
+    """Write values (starting at sheet row start_row) into the mirror, only touching rows that changed"""
+    table = TABLES[table_name]
+    placeholders = ", ".join("?" * (len(table.columns) + 2))
+    existing = dict(db.execute(f"SELECT row, data FROM {table_name} WHERE row >= ?", [start_row]).fetchall())
+    changed = []
+    for row_num, values_row in enumerate(values, start=start_row):
+        record = _record(table, row_num, values_row)
+        if existing.get(row_num) != record[1]:
+            changed.append(record)
+    last_row = start_row + len(values) - 1
+    synced_rows = _state(table_name)[0]
+    deleted = 0
+    with db:
+        db.executemany(f"INSERT OR REPLACE INTO {table_name} VALUES ({placeholders})", changed)
+        if full:
+            # rows that were deleted from the bottom of the sheet
+            deleted = db.execute(f"DELETE FROM {table_name} WHERE row > ?", [last_row]).rowcount
+        _save_state(table_name, max(last_row, start_row - 1), full)
+    if changed or deleted:
+        version = _versions[table_name]
+        version[0] += 1
+        if deleted or any(record[0] <= synced_rows for record in changed):
+            version[1] = version[0]
+    if changed:
+        logger.info(f"Mirror: {len(changed)} row(s) updated in {table_name}")
+
+
+async def sync(table_name):
+    """Bring one mirrored table up to date with its sheet"""
+    table = TABLES[table_name]
+    async with _locks[table_name]:
+        ws = await sheets.worksheet(table.key, table.name)
+        synced_rows, _, full_sync_at = _state(table_name)
+        if table.append_only and synced_rows and time.time() - full_sync_at < FULL_SYNC_SECONDS:
+            # Read from the last row we already have. If it still matches, only the rows after it are new.
+            values = await sheets.call(ws.get, f"A{synced_rows}:Z")
+            last = db.execute(f"SELECT data FROM {table_name} WHERE row = ?", [synced_rows]).fetchone()
+            if values and last and json.loads(last[0]) == _trim(values[0]):
+                _store(table_name, synced_rows + 1, values[1:], full=False)
+                return
+            logger.info(f"Mirror: {table_name} changed above row {synced_rows}, doing a full sync")
+        values = await sheets.call(ws.get_all_values)
+        _store(table_name, 1, values, full=True)
+
+
+def expire(table_name):
+    """Make the next refresh() sync this table no matter how recently it was synced. Call this after the
+    bot changes one of the mirrored tabs itself."""
+    with db:
+        db.execute("UPDATE sync_state SET synced_at = 0 WHERE table_name = ?", [table_name])
+
+
+async def refresh(*table_names, max_age=60):
+    """Sync the given tables (all the synced ones if none are given) if they haven't been synced in max_age
+    seconds. Failures are logged and whatever is already in the mirror is used."""
+    table_names = table_names or [t for t, table in TABLES.items() if table.synced]
+    stale = [t for t in table_names if time.time() - _state(t)[1] > max_age]
+    results = await asyncio.gather(*[sync(t) for t in stale], return_exceptions=True)
+    for table_name, result in zip(stale, results):
+        if isinstance(result, Exception):
+            logger.warning(f"Mirror: syncing {table_name} failed, using local copy: {result}")
+
+
+def rows(table_name, **match):
+    """Rows from a mirrored table as (sheet row number, values) in sheet order. Keyword arguments filter on
+    the table's indexed columns, for example rows("sick", name="Jon Smith"). Pass a list to match any of
+    several values, like rows("sick", name=["Jon Smith", "Jonathan Smith"])."""
+    conditions = []
+    params = []
+    for column, value in match.items():
+        if isinstance(value, (list, tuple)):
+            conditions.append(f"{column} IN ({', '.join('?' * len(value))})")
+            params.extend(value)
+        else:
+            conditions.append(f"{column} = ?")
+            params.append(value)
+    sql = f"SELECT row, data FROM {table_name}"
+    if conditions:
+        sql += " WHERE " + " AND ".join(conditions)
+    sql += " ORDER BY row"
+    return _padded(table_name, db.execute(sql, params))
+
+
+def rows_between(table_name, column, start, end):
+    """Rows where an indexed column falls between start and end (inclusive), as (row number, values)"""
+    sql = f"SELECT row, data FROM {table_name} WHERE {column} BETWEEN ? AND ? ORDER BY row"
+    return _padded(table_name, db.execute(sql, [start, end]))
+
+
+def rows_after(table_name, row):
+    """Rows below the given sheet row, as (row number, values). Handy for picking up only what's new."""
+    return _padded(table_name, db.execute(f"SELECT row, data FROM {table_name} WHERE row > ? ORDER BY row", [row]))
+
+
+def version(table_name):
+    """(change count, change count at the last change other than rows added at the bottom) for a table.
+    Both start at 0 each time the bot starts."""
+    return tuple(_versions[table_name])
+
+
+def _padded(table_name, results):
+    # Rows are stored without their empty trailing cells. Pad them back out like get_all_values does so
+    # callers can index any column without worrying about it (at least up to the last indexed column).
+    results = [(row, json.loads(data)) for row, data in results]
+    width = max([len(values) for _, values in results] + [max(TABLES[table_name].columns.values()) + 1])
+    return [(row, values + [""] * (width - len(values))) for row, values in results]
+
+
+def values_for(key, name):
+    """What get_all_values would have returned for a mirrored tab, or None if we don't mirror it. This is
+    the fallback sheets.get_values() uses when Google can't be reached."""
+    for table_name, table in TABLES.items():
+        if (table.key, table.name) == (key, name) and _state(table_name)[0]:
+            return [values for _, values in rows(table_name)]
+    return None
+
+
+def save(key, name, values):
+    """Keep a copy of values that sheets.get_values() just read, if it's one of the fallback only tabs"""
+    for table_name, table in TABLES.items():
+        if (table.key, table.name) == (key, name) and not table.synced:
+            _store(table_name, 1, values, full=True)
+
+
+async def _sync_loop():
+    while True:
+        await refresh(max_age=SYNC_SECONDS - 5)
+        await asyncio.sleep(SYNC_SECONDS)
+
+
+def start():
+    """Start keeping the mirror in sync in the background. Needs a running event loop."""
+    global _sync_task
+    if _sync_task is None or _sync_task.done():
+        _sync_task = asyncio.get_running_loop().create_task(_sync_loop())
+    sheets.set_fallback(values_for, save)
+
+
+_create_tables()
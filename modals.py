@@ -0,0 +1,467 @@
+# The bigger modals, built once as templates (see templates.py).
+# Handlers open them with render(), passing whatever changes each time.
+import creds
+
+from templates import Slot, Template, options
+
+
+def _context(block_id, text):
+    """The context block at the bottom of a form that carries something (channel, message) to the view handler"""
+    return {
+        "type": "context",
+        "block_id": block_id,
+        "elements": [
+            {
+                "type": "plain_text",
+                "text": text
+            }
+        ]
+    }
+
+
+def _text_input(block_id, label, action_id, multiline=False, optional=False):
+    return {
+        "type": "input",
+        "block_id": block_id,
+        "label": {"type": "plain_text", "text": label},
+        "element": {
+            "type": "plain_text_input",
+            "action_id": action_id,
+            "multiline": multiline
+        },
+        "optional": optional
+    }
+
+
+def _select(block_id, label, action_id, placeholder, select_options):
+    return {
+        "type": "input",
+        "block_id": block_id,
+        "label": {"type": "plain_text", "text": label},
+        "element": {
+            "type": "static_select",
+            "action_id": action_id,
+            "placeholder": {"type": "plain_text", "text": placeholder},
+            "options": select_options
+        }
+    }
+
+
+# /injury
+INJURY = Template({
+    "type": "modal",
+    "callback_id": "add_injury_view",
+    "title": {"type": "plain_text", "text": "Add Sedgwick Claim"},
+    "submit": {"type": "plain_text", "text": "Submit"},
+    "blocks": [
+        {
+            "type": "input",
+            "block_id": "input_a",
+            "label": {"type": "plain_text", "text": "Select date of incident:"},
+            "element": {
+                "type": "datepicker",
+                "action_id": "incident_date",
+                "initial_date": Slot("today"),
+                "placeholder": {
+                    "type": "plain_text",
+                    "text": "Date of incident",
+                    "emoji": True
+                }
+            }
+        },
+        {
+            "type": "input",
+            "block_id": "input_aa",
+            "label": {"type": "plain_text", "text": "Select time of incident:"},
+            "element": {
+                "type": "timepicker",
+                "action_id": "incident_time",
+                "initial_time": "12:00",
+                "placeholder": {
+                    "type": "plain_text",
+                    "text": "Time of incident",
+                    "emoji": True
+                }
+            }
+        },
+        _text_input("input_b", "Location:", "location"),
+        {
+            "type": "divider"
+        },
+        _text_input("input_c", "Director completing the report:", "director"),
+        _text_input("input_d", "Employee (full name):", "employee"),
+        _text_input("input_e", "Employee Date of Birth:", "date_of_birth"),
+        _text_input("input_f", "Sedgwick Claim Number:", "claim_num"),
+        _text_input("input_g", ("Description of Incident (please note if any physical evidence or video was "
+                                "captured):"), "description", multiline=True),
+        _context("context_a", Slot("channel_id"))
+    ]
+})
+
+# /cater remove
+CATER_REMOVE = Template({
+    "type": "modal",
+    "callback_id": "cater_remove_view",
+    "title": {"type": "plain_text", "text": "Remove Catering Order"},
+    "submit": {"type": "plain_text", "text": "Delete"},
+    "blocks": [
+        {
+            "type": "input",
+            "block_id": "block_order",
+            "label": {"type": "plain_text", "text": "Order to remove:"},
+            "element": {
+                "type": "static_select",
+                "placeholder": {"type": "plain_text", "text": "Select an order"},
+                "options": Slot("orders"),
+                "action_id": "input_order"
+            }
+        },
+        _context("block_channel", Slot("channel_id"))
+    ]
+})
+
+_ORDER_TYPES = [
+    {
+        "text": {"type": "plain_text", "text": "Pickup"},
+        "value": "pickup"
+    },
+    {
+        "text": {"type": "plain_text", "text": "Delivery"},
+        "value": "delivery"
+    }
+]
+
+# /cater add, before the order type is picked
+CATER_ADD = Template({
+    "type": "modal",
+    "callback_id": "cater_add_view",
+    "title": {"type": "plain_text", "text": "Add Catering Order"},
+    "submit": {"type": "plain_text", "text": "Add"},
+    "blocks": [
+        {
+            "type": "input",
+            "block_id": "block_date",
+            "label": {"type": "plain_text", "text": "Date:"},
+            "element": {
+                "type": "datepicker",
+                "action_id": "input_date",
+                "initial_date": Slot("today"),
+                "placeholder": {
+                    "type": "plain_text",
+                    "text": "Select date..."
+                }
+            }
+        },
+        {
+            "type": "input",
+            "block_id": "block_time",
+            "label": {"type": "plain_text", "text": "Time:"},
+            "element": {
+                "type": "timepicker",
+                "action_id": "input_time",
+                "initial_time": "11:15",
+                "placeholder": {
+                    "type": "plain_text",
+                    "text": "Select time..."
+                }
+            }
+        },
+        {
+            "type": "section",
+            "block_id": "block_type",
+            "text": {"type": "plain_text", "text": "Order Type:"},
+            "accessory": {
+                "type": "radio_buttons",
+                "options": _ORDER_TYPES,
+                "action_id": "input_type"
+            }
+        }
+    ]
+})
+
+
+def _cater_order(extra_blocks):
+    """/cater add once the order type is picked, keeping what was already filled in"""
+    return Template({
+        "type": "modal",
+        "callback_id": "cater_add_view",
+        "title": {"type": "plain_text", "text": "Add Catering Order"},
+        "submit": {"type": "plain_text", "text": "Add"},
+        "blocks": [
+            {
+                "type": "input",
+                "block_id": "block_date",
+                "label": {"type": "plain_text", "text": "Date:"},
+                "element": {
+                    "type": "datepicker",
+                    "action_id": "input_date",
+                    "initial_date": Slot("date"),
+                }
+            },
+            {
+                "type": "input",
+                "block_id": "block_time",
+                "label": {"type": "plain_text", "text": "Time:"},
+                "element": {
+                    "type": "timepicker",
+                    "action_id": "input_time",
+                    "initial_time": Slot("time"),
+                }
+            },
+            {
+                "type": "section",
+                "block_id": "block_type",
+                "text": {"type": "plain_text", "text": "Order Type:"},
+                "accessory": {
+                    "type": "radio_buttons",
+                    "initial_option": Slot("order_type"),
+                    "options": _ORDER_TYPES,
+                    "action_id": "input_type"
+                }
+            }
+        ] + extra_blocks
+    })
+
+
+def _cater_input(block_id, label, action_id):
+    return {
+        "type": "input",
+        "block_id": block_id,
+        "element": {"type": "plain_text_input", "action_id": action_id},
+        "label": {"type": "plain_text", "text": label}
+    }
+
+
+CATER_PICKUP = _cater_order([
+    _cater_input("block_customer", "Customer Name", "input_customer"),
+    _cater_input("block_phone", "Phone Number", "input_phone")
+])
+CATER_DELIVERY = _cater_order([
+    {
+        "type": "input",
+        "block_id": "block_driver",
+        "label": {"type": "plain_text", "text": "Driver:"},
+        "element": {
+            "type": "static_select",
+            "placeholder": {"type": "plain_text", "text": "Select a driver"},
+            "options": Slot("drivers"),
+            "action_id": "input_driver"
+        }
+    },
+    _cater_input("block_customer", "Customer Name", "input_customer"),
+    _cater_input("block_address", "Address", "input_address"),
+    _cater_input("block_phone", "Phone Number", "input_phone")
+])
+
+# /add
+ADD_HIRE = Template({
+    "type": "modal",
+    "callback_id": "add_view",
+    "title": {"type": "plain_text", "text": "Add New Hire"},
+    "submit": {"type": "plain_text", "text": "Submit"},
+    "blocks": [
+        {
+            "type": "input",
+            "block_id": "input_a",
+            "label": {"type": "plain_text", "text": "Location:"},
+            "element": {
+                "type": "static_select",
+                "placeholder": {
+                    "type": "plain_text",
+                    "text": "Select FOH or BOH"
+                },
+                "action_id": "select_1",
+                "options": [
+                    {
+                        "text": {
+                            "type": "plain_text",
+                            "text": "Front of House"
+                        },
+                        "value": "FOH"
+                    },
+                    {
+                        "text": {
+                            "type": "plain_text",
+                            "text": "Back of House"
+                        },
+                        "value": "BOH"
+                    }
+                ]
+            }
+        },
+        _text_input("input_b", "Full Name:", "full_name"),
+        {
+            "type": "input",
+            "block_id": "input_c",
+            "label": {"type": "plain_text", "text": "Select start date:"},
+            "element": {
+                "type": "datepicker",
+                "action_id": "start_date",
+                "initial_date": Slot("start_date"),
+                "placeholder": {
+                    "type": "plain_text",
+                    "text": "Start date"
+                }
+            }
+        },
+        _text_input("input_d", "Food Card Number:", "food_card_number", optional=True),
+        {
+            "type": "input",
+            "block_id": "input_e",
+            "label": {"type": "plain_text", "text": "Food Card Expiration:"},
+            "element": {
+                "type": "datepicker",
+                "action_id": "food_card_date",
+                "initial_date": Slot("card_expiration"),
+                "placeholder": {
+                    "type": "plain_text",
+                    "text": "Expiration date"
+                }
+            }
+        },
+        _context("context_a", Slot("channel_id"))
+    ]
+})
+
+# /discipline
+DISCIPLINE = Template({
+    "type": "modal",
+    "callback_id": "discipline_view",
+    "title": {"type": "plain_text", "text": "Discipline Tracking"},
+    "submit": {"type": "plain_text", "text": "Submit"},
+    "blocks": [
+        _select("input_name", "Select a name", "tm_name", "Select a name", Slot("names")),
+        _select("input_type", "Type of Discipline", "discipline_type", "Select type of discipline",
+                options(["Verbal", "Written", "PIP", "Final", "Suspension", "Termination"])),
+        _select("input_method", "Method of Communication", "method_type", "Select method of communication",
+                options(["Email", "Face-to-Face"])),
+        _text_input("input_reason", "Reason for Discipline", "reason", multiline=True),
+        _text_input("input_leader", "Your Name (Leader providing discipline)", "leader"),
+        _text_input("input_other", "Other notes", "other", optional=True)
+    ]
+})
+
+
+def _hinted_input(block_id, label, action_id, hint):
+    block = _text_input(block_id, label, action_id)
+    block['hint'] = {"type": "plain_text", "text": hint}
+    return block
+
+
+# /sick
+SICK = Template({
+    "type": "modal",
+    "callback_id": "sick_view",
+    "title": {"type": "plain_text", "text": "Missed Shift"},
+    "submit": {"type": "plain_text", "text": "Submit"},
+    "blocks": [
+        _select("input_a", "Name", "tm_name", "Select a name", Slot("names")),
+        _hinted_input("input_b", "Callout Reason", "reason", "Use NCNS for No Call/No Show"),
+        _hinted_input("input_c", "Missed Shift", "shift", "Position and Time"),
+        _hinted_input("input_d", "Contact Person/Method", "contact",
+                      "Hot Schedules or the name of the leader that spoke to the TM"),
+        _text_input("input_e", "Other notes", "other", optional=True)
+    ]
+})
+
+
+def _weight(block_id, label, action_id):
+    return {
+        "type": "input",
+        "block_id": block_id,
+        "label": {"type": "plain_text", "text": label},
+        "element": {
+            "type": "plain_text_input",
+            "action_id": action_id,
+            "initial_value": "0"
+        },
+        "hint": {"type": "plain_text", "text": "Weight in decimal pounds"}
+    }
+
+
+_WEIGHTS = [
+    {
+        "type": "section",
+        "block_id": "section_info",
+        "text": {
+            "type": "plain_text",
+            "text": "Please enter weight as a decimal. For example, 1.25 instead of 1lb 4oz."
+        }
+    },
+    _weight("input_b", "Regular Filets", "regulars"),
+    _weight("input_c", "Spicy Filets", "spicy"),
+    _weight("input_d", "Nuggets", "nuggets"),
+    _weight("input_e", "Strips", "strips"),
+    _weight("input_f", "Grilled Filets", "grilled1"),
+    _weight("input_g", "Grilled Nuggets", "grilled2")
+]
+# Only asked for before 1pm
+_BREAKFAST_WEIGHTS = [
+    _weight("input_h", "Breakfast Filets", "breakfast"),
+    _weight("input_k", "Spicy Breakfast Filets", "spicy_breakfast"),
+    _weight("input_i", "Grilled Breakfast", "grilled3")
+]
+
+
+def _waste(first_blocks, breakfast):
+    return Template({
+        "type": "modal",
+        "callback_id": "waste_view",
+        "title": {"type": "plain_text", "text": "Waste Form"},
+        "submit": {"type": "plain_text", "text": "Submit"},
+        "blocks": first_blocks + _WEIGHTS + (_BREAKFAST_WEIGHTS if breakfast else []) + [
+            _text_input("input_j", "Additional Info", "other", multiline=True, optional=True),
+            _context("context_a", Slot("message_ts"))
+        ]
+    })
+
+
+# /waste, outside the scheduled times. The view handler doesn't find leaders or times here and fills those in.
+_NO_LEADERS = [
+    {
+        "type": "context",
+        "block_id": "input_a",
+        "elements": [{
+            "type": "plain_text",
+            "text": "placeholder"
+        }]
+    },
+    {
+        "type": "context",
+        "block_id": "input_a2",
+        "elements": [{
+            "type": "plain_text",
+            "text": "placeholder"
+        }]
+    }
+]
+WASTE = _waste(_NO_LEADERS, breakfast=False)
+WASTE_BREAKFAST = _waste(_NO_LEADERS, breakfast=True)
+
+# The Waste Tracking button on the scheduled reminder
+_LEADERS = [
+    {
+        "type": "input",
+        "block_id": "input_a",
+        "label": {"type": "plain_text", "text": "Leaders on"},
+        "element": {
+            "type": "multi_static_select",
+            "action_id": "leader_names",
+            "placeholder": {"type": "plain_text", "text": "Select leaders"},
+            "options": Slot("leaders")
+        }
+    },
+    {
+        "type": "input",
+        "block_id": "input_a2",
+        "label": {"type": "plain_text", "text": "Report Time(s) Covered"},
+        "element": {
+            "type": "multi_static_select",
+            "action_id": "times",
+            "placeholder": {"type": "plain_text", "text": "Times covered"},
+            "options": options(creds.times)
+        }
+    }
+]
+WASTE_REPORT = _waste(_LEADERS, breakfast=False)
+WASTE_REPORT_BREAKFAST = _waste(_LEADERS, breakfast=True)
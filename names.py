@@ -0,0 +1,72 @@
+# Fuzzy team member name lookups for commands like /tardy and /find (see team.py).
+# Scoring every name on the roster with fuzzywuzzy gets slow once the list has a few thousand current and
+# former team members in it. Instead, every name is broken into trigrams (three letter pieces) once when the
+# roster changes. A lookup only scores the names that share the most trigrams with what was typed.
+import re
+
+from collections import Counter, defaultdict
+from fuzzywuzzy import process
+
+# How many of the best trigram matches get a real fuzzywuzzy score
+SHORTLIST = 25
+
+
+def normalize(name):
+    """Lowercase, drop punctuation and squash spaces so "O'Neil,  Pat" and "oneil pat" look the same"""
+    return " ".join(re.sub(r"[^\w\s]", "", name.lower()).split())
+
+
+def trigrams(text):
+    grams = set()
+    for token in text.split():
+        padded = f"  {token} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+class NameIndex:
+    def __init__(self, names=()):
+        self.names = []
+        self.normalized = []
+        self.postings = defaultdict(list)
+        self.update(names)
+
+    def update(self, names):
+        """Rebuild the index if the list of names changed"""
+        names = list(names)
+        if names == self.names:
+            return
+        self.names = []
+        self.normalized = []
+        self.postings = defaultdict(list)
+        for name in names:
+            self.add(name)
+
+    def add(self, name):
+        """Add one name to the index and return its position"""
+        text = normalize(name)
+        position = len(self.names)
+        self.names.append(name)
+        self.normalized.append(text)
+        for gram in trigrams(text):
+            self.postings[gram].append(position)
+        return position
+
+    def candidates(self, query, limit=SHORTLIST):
+        """Positions of the names sharing the most trigrams with query (already normalized)"""
+        counts = Counter()
+        for gram in trigrams(query):
+            counts.update(self.postings.get(gram, ()))
+        return [i for i, _ in counts.most_common(limit)]
+
+    def best(self, query, limit=5):
+        """The closest names to query as (name, score) pairs, best first, like process.extractBests"""
+        query = normalize(query)
+        shortlist = self.candidates(query)
+        if not shortlist:
+            return []
+        choices = {i: self.normalized[i] for i in shortlist}
+        # extractBests hands back the dict key of each choice, which maps back to the original spelling
+        matches = process.extractBests(query, choices, processor=None, limit=limit)
+        return [(self.names[i], score) for _, score, i in matches]
+
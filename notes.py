@@ -0,0 +1,80 @@
+# Weekly Shift Notes for the Home tab.
+# The Shift Notes tab has one note per row: the heading it goes under (Leadership Notes, All Store Notes,
+# FOH Notes, BOH Notes) and the note itself. It is parsed once each time the sheet changes, and the Home tab
+# blocks for every area are built right then, so showing or swapping notes is just picking a list of blocks.
+import creds
+import sheets
+
+LEADER_HEADING = "Leadership Notes"
+ALL_HEADING = "All Store Notes"
+
+
+def _section(heading, notes):
+    return {
+        "type": "rich_text",
+        "elements": [
+            {
+                "type": "rich_text_section",
+                "elements": [
+                    {
+                        "type": "text",
+                        "text": f"{heading}\n"
+                    }
+                ]
+            },
+            {
+                "type": "rich_text_list",
+                "style": "bullet",
+                "elements": [
+                    {
+                        "type": "rich_text_section",
+                        "elements": [{"type": "text", "text": note}]
+                    }
+                    for note in notes
+                ]
+            }
+        ]
+    }
+
+
+class ShiftNotes:
+    def __init__(self, values):
+        """values is the Shift Notes tab as get_all_values returns it"""
+        self.values = values
+        # heading -> notes under it, in sheet order
+        self.notes = {}
+        for row in values:
+            if len(row) > 1 and row[0]:
+                self.notes.setdefault(row[0], []).append(row[1])
+        self._leader_blocks = [
+            _section(LEADER_HEADING, self.notes.get(LEADER_HEADING, [])),
+            {"type": "divider"},
+            _section(ALL_HEADING, self.notes.get(ALL_HEADING, [])),
+            {"type": "divider"}
+        ]
+        self._area_blocks = {}
+
+    def blocks(self, area):
+        """Home tab blocks for someone working in area (FOH or BOH). Always five blocks: leadership notes,
+        divider, all store notes, divider, area notes. Don't modify them, they are shared."""
+        if area not in self._area_blocks:
+            heading = f"{area} Notes"
+            self._area_blocks[area] = self._leader_blocks + [_section(heading, self.notes.get(heading, []))]
+        return self._area_blocks[area]
+
+
+_latest = ShiftNotes([])
+
+
+async def current():
+    """The Shift Notes, reparsed only when the cached sheet values change"""
+    global _latest
+    values = await sheets.get_values(creds.staff_id, "Shift Notes")
+    if values is not _latest.values:
+        _latest = ShiftNotes(values)
+    return _latest
+
+
+def latest():
+    """The most recently parsed Shift Notes, without checking the sheet"""
+    return _latest
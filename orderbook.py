@@ -0,0 +1,62 @@
+# Catering orders as they come off the sheet: date, time, driver (or PICKUP/ADP), guest, address, phone.
+# This is only the reading and indexing part, with no Google Sheets client of its own, so cater_remind.py can use
+# it without pulling in everything catering.py needs to keep the bot's copy up to date.
+import dates
+import hashlib
+import json
+
+from bisect import bisect_left, bisect_right
+from collections import defaultdict
+from datetime import date, datetime
+
+COLUMNS = 6
+
+
+def order_date(row):
+    """The date of an order row as a date, or None if it can't be read"""
+    return dates.parse_date(row[0])
+
+
+def sort_key(row):
+    """Where a row belongs on the sheet. Rows with a date we can't read go to the bottom."""
+    return (order_date(row) or date.max, dates.parse_time(row[1]) or datetime.max.time())
+
+
+def fingerprint(row):
+    """A short stand-in for an order's contents. /cater remove puts it in the modal next to the row number,
+    so the row can be checked before it's deleted."""
+    cells = [cell.strip() for cell in row[:COLUMNS]] + [""] * (COLUMNS - len(row))
+    return hashlib.sha1(json.dumps(cells).encode()).hexdigest()[:12]
+
+
+class OrderBook:
+    """Catering orders from one read of the sheet, indexed by date and by driver"""
+    def __init__(self, values, first_row=2):
+        """values is what get_values("A2:F") returns. first_row is the sheet row the first of them is on."""
+        self.rows = [row + [""] * (COLUMNS - len(row)) for row in values]
+        self.keys = [sort_key(row) for row in self.rows]
+        self.first_row = first_row
+        self.by_date = defaultdict(list)
+        self.by_driver = defaultdict(list)
+        for i, (key, row) in enumerate(zip(self.keys, self.rows)):
+            self.by_date[key[0]].append(i)
+            self.by_driver[row[2].strip().lower()].append(i)
+
+    def _orders(self, positions):
+        return [(self.first_row + i, self.rows[i]) for i in positions]
+
+    def on(self, day):
+        """(sheet row, values) for every order on the given date"""
+        return self._orders(self.by_date.get(day, []))
+
+    def for_driver(self, driver, day=None):
+        """(sheet row, values) for every order assigned to a driver, optionally only on one date"""
+        positions = self.by_driver.get(driver.strip().lower(), [])
+        return self._orders(i for i in positions if day is None or self.keys[i][0] == day)
+
+    def between(self, start, end):
+        """(sheet row, values) for every order from start through end (both dates)"""
+        days = sorted(self.by_date)
+        first = bisect_left(days, start)
+        last = bisect_right(days, end)
+        return self._orders(i for day in days[first:last] for i in self.by_date[day])
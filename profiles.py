@@ -0,0 +1,60 @@
+# Slack user profiles, kept in memory.
+# Most forms post "Submitted by: <real name>", and looking that up with users_info on every submission is a
+# round trip to Slack each time. Instead the whole workspace is loaded once at startup with users_list (a page at
+# a time), kept up to date from user_change and team_join events, and anyone we still don't know is looked up
+# with users_info and remembered.
+import asyncio
+
+from loguru import logger
+
+PAGE_SIZE = 200
+
+# user ID -> user object as Slack sends it
+_users = {}
+_warm_lock = asyncio.Lock()
+_warmed = False
+
+
+async def warm(client):
+    """Load every user in the workspace. Only the first call does anything."""
+    global _warmed
+    async with _warm_lock:
+        if _warmed:
+            return
+        cursor = None
+        count = 0
+        try:
+            while True:
+                page = await client.users_list(limit=PAGE_SIZE, cursor=cursor)
+                for user in page['members']:
+                    _users[user['id']] = user
+                    count += 1
+                cursor = page.get('response_metadata', {}).get('next_cursor')
+                if not cursor:
+                    break
+        except Exception:
+            # get() still works, it just asks Slack more often
+            logger.exception("Loading Slack profiles failed. Falling back to users_info.")
+            return
+        _warmed = True
+        logger.info(f"Loaded {count} Slack profile(s)")
+
+
+def update(user):
+    """Store a user object from a user_change or team_join event"""
+    _users[user['id']] = user
+
+
+async def get(client, user_id):
+    """The user object for user_id, from memory if we have it, otherwise from users_info"""
+    user = _users.get(user_id)
+    if user is None:
+        response = await client.users_info(user=user_id)
+        user = response['user']
+        _users[user_id] = user
+    return user
+
+
+async def real_name(client, user_id):
+    user = await get(client, user_id)
+    return user.get('real_name') or user.get('profile', {}).get('real_name') or user['name']
@@ -0,0 +1,127 @@
+# Google Sheets quota handling shared by app.py and the cron scripts.
+# Everything runs under the same service account, so a burst of /find calls in the bot eats into the same
+# per-minute quota the 2am scraper needs. Every Sheets request goes through call() here, which waits for a
+# token from a bucket that all of our processes share (through a lock file) and retries rate limit and
+# server errors with jittered exponential backoff.
+import fcntl
+import gspread
+import json
+import os
+import random
+import threading
+import time
+
+from loguru import logger
+
+# Google's default is 60 read and 60 write requests per minute per user. Stay a little under that.
+REQUESTS_PER_MINUTE = 55
+# How many requests can go out back to back after a quiet spell
+BURST = 10
+MAX_RETRIES = 5
+BASE_BACKOFF = 1
+MAX_BACKOFF = 64
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+# Lives next to this file so cron jobs started from any directory share it with the bot
+QUOTA_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "sheets_quota.json")
+
+
+class RateLimiter:
+    """Token bucket whose state is kept in a file, so every process using it draws from the same bucket"""
+    def __init__(self, path, per_minute, burst):
+        self.path = path
+        self.rate = per_minute / 60
+        self.burst = burst
+        self._waiting = 0
+        self._count_lock = threading.Lock()
+
+    @property
+    def queue_depth(self):
+        """Number of requests in this process that are waiting for a token"""
+        return self._waiting
+
+    def acquire(self):
+        """Block until a request is allowed to go out"""
+        with self._count_lock:
+            self._waiting += 1
+        try:
+            while True:
+                wait = self._take()
+                if wait <= 0:
+                    return
+                time.sleep(wait)
+        finally:
+            with self._count_lock:
+                self._waiting -= 1
+
+    def pause(self, seconds):
+        """Stop every process from sending requests for a while (after Google tells us to slow down)"""
+        self._update(lambda state, now: state.update(paused_until=max(state['paused_until'], now + seconds)))
+
+    def _take(self):
+        result = {}
+
+        def take(state, now):
+            if state['paused_until'] > now:
+                result['wait'] = state['paused_until'] - now
+                return
+            tokens = min(self.burst, state['tokens'] + (now - state['updated']) * self.rate)
+            if tokens >= 1:
+                tokens -= 1
+                result['wait'] = 0
+            else:
+                result['wait'] = (1 - tokens) / self.rate
+            state.update(tokens=tokens, updated=now)
+
+        self._update(take)
+        return result['wait']
+
+    def _update(self, change):
+        with open(self.path, "a+") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                f.seek(0)
+                raw = f.read()
+                now = time.time()
+                try:
+                    state = json.loads(raw)
+                except ValueError:
+                    state = {"tokens": self.burst, "updated": now, "paused_until": 0}
+                change(state, now)
+                f.seek(0)
+                f.truncate()
+                f.write(json.dumps(state))
+                f.flush()
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+
+limiter = RateLimiter(QUOTA_FILE, REQUESTS_PER_MINUTE, BURST)
+
+
+def call(func, *args, idempotent=True, **kwargs):
+    """Run a blocking gspread call once the shared rate limiter allows it, retrying 429s and 5xx errors.
+
+    429s are always retried since Google didn't act on them. 5xx errors are only retried when idempotent is
+    True. Pass idempotent=False for appends, inserts and deletes, where Google may have done the work before
+    the error and a second try would add a duplicate row or delete the wrong one.
+
+    Example usage:
+    sheet = quota.call(spreadsheet.worksheet, "Data")
+    quota.call(sheet.append_rows, rows, idempotent=False)
+    """
+    for attempt in range(MAX_RETRIES + 1):
+        limiter.acquire()
+        try:
+            return func(*args, **kwargs)
+        except gspread.exceptions.APIError as e:
+            status = e.response.status_code
+            retry = status == 429 or (idempotent and status in RETRY_STATUSES)
+            if not retry or attempt == MAX_RETRIES:
+                raise
+            backoff = min(MAX_BACKOFF, BASE_BACKOFF * 2 ** attempt)
+            delay = backoff / 2 + random.uniform(0, backoff / 2)
+            if status == 429:
+                # Out of quota for everybody, not just this request
+                limiter.pause(delay)
+            logger.warning(f"Google Sheets returned {status}, retrying in {delay:.1f}s (attempt {attempt + 1})")
+            time.sleep(delay)
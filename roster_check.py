@@ -0,0 +1,183 @@
+import creds
+import gspread
+import names
+import quota
+import requests
+
+from collections import defaultdict
+from fuzzywuzzy import fuzz
+from loguru import logger
+
+# Connect to Google Sheets
+gc = gspread.service_account(filename=creds.gspread)
+webhook_url = creds.webhook_test
+
+# Two spellings this close (token_sort_ratio) are probably the same person
+MATCH_RATIO = 85
+# A block bigger than this is a blocking key that's too common to be useful (lots of J. Smiths), so skip it
+# instead of comparing everything in it with everything else
+MAX_BLOCK = 50
+SOUNDEX_CODES = {c: str(d) for d, letters in enumerate(["aeiouyhw", "bfpv", "cgjkqsxz", "dt", "l", "mn", "r"])
+                 for c in letters}
+
+
+class Entry:
+    def __init__(self, sheet, row, name):
+        self.sheet = sheet
+        self.row = row
+        self.name = name
+        self.normalized = names.normalize(name)
+        self.tokens = self.normalized.split()
+
+
+def soundex(word):
+    """Classic four character Soundex code, so Smith and Smyth end up with the same key"""
+    if not word:
+        return ""
+    code = word[0].upper()
+    last = SOUNDEX_CODES.get(word[0], "")
+    for c in word[1:]:
+        digit = SOUNDEX_CODES.get(c, "")
+        if digit and digit != "0" and digit != last:
+            code += digit
+        if c not in "hw":
+            last = digit
+    return (code + "000")[:4]
+
+
+def read_names(key, name, col=1, header_rows=1, last_first=False):
+    """One Entry per non-blank name on a tab. last_first flips "Last, First" around to "First Last"."""
+    spreadsheet = quota.call(gc.open_by_key, key)
+    sheet = quota.call(spreadsheet.worksheet, name)
+    values = quota.call(sheet.col_values, col)
+    entries = []
+    for row, value in enumerate(values[header_rows:], start=header_rows + 1):
+        if not value.strip():
+            continue
+        if last_first and "," in value:
+            last, first = value.split(",", 1)
+            value = f"{first.strip()} {last.strip()}"
+        entries.append(Entry(name, row, value))
+    return entries
+
+
+def block_keys(entry):
+    """Keys that likely matches share. Built from both ends of the name so "Smith Jon" lands with "Jon Smith"."""
+    if not entry.tokens:
+        return set()
+    first, last = entry.tokens[0], entry.tokens[-1]
+    keys = {f"{soundex(last)}{first[0]}", f"{soundex(first)}{last[0]}"}
+    # letter n-grams catch what Soundex misses (it keeps the first letter, so Cathy and Kathy differ)
+    keys.update({f"{last[:3]}{first[0]}", f"{first[:3]}{last[0]}", f"{last[1:4]}{first[1:2]}"})
+    return keys
+
+
+def same_person(a, b):
+    """Different spellings that are probably the same person (Jon Smith and Jonathan Smith for example)"""
+    if a.normalized == b.normalized:
+        return True
+    if fuzz.token_sort_ratio(a.normalized, b.normalized) >= MATCH_RATIO:
+        return True
+    # same last name and one first name is the start of the other
+    if len(a.tokens) > 1 and len(b.tokens) > 1 and a.tokens[-1] == b.tokens[-1]:
+        return a.tokens[0].startswith(b.tokens[0]) or b.tokens[0].startswith(a.tokens[0])
+    return False
+
+
+def likely_matches(entries):
+    """Pairs of entries that look like the same person. Only entries sharing a blocking key get compared, so
+    this stays close to linear instead of comparing every name with every other name."""
+    blocks = defaultdict(list)
+    for i, entry in enumerate(entries):
+        for key in block_keys(entry):
+            blocks[key].append(i)
+    pairs = set()
+    for key, members in blocks.items():
+        if len(members) > MAX_BLOCK:
+            logger.warning(f"Skipping block {key} with {len(members)} names")
+            continue
+        for x, i in enumerate(members):
+            for j in members[x + 1:]:
+                if (i, j) not in pairs and same_person(entries[i], entries[j]):
+                    pairs.add((i, j))
+    return [(entries[i], entries[j]) for i, j in sorted(pairs)]
+
+
+def describe(entry):
+    return f"{entry.name} ({entry.sheet} row {entry.row})"
+
+
+def main():
+    """Look for duplicate and mismatched names across the sheets /add and /depart keep up to date"""
+    staff = read_names(creds.staff_id, "Staff", header_rows=0)
+    pay_scale = read_names(creds.pay_scale_id, "Champs Info")
+    cards = read_names(creds.card_id, "Food handler cards", last_first=True)
+    departures = read_names(creds.departure_id, "Departures", col=2)
+    entries = staff + pay_scale + cards + departures
+
+    duplicates = []
+    spellings = []
+    departed = []
+    matched = defaultdict(set)
+    for a, b in likely_matches(entries):
+        matched[id(a)].add(b.sheet)
+        matched[id(b)].add(a.sheet)
+        if a.sheet == b.sheet:
+            # Departures is a log, so somebody who left twice (rehires) shows up more than once
+            if a.sheet != "Departures":
+                duplicates.append(f"{describe(a)} and {describe(b)}")
+        elif "Departures" in (a.sheet, b.sheet):
+            current = b if a.sheet == "Departures" else a
+            if current.sheet == "Staff":
+                departed.append(describe(current))
+        elif a.normalized != b.normalized:
+            spellings.append(f"{describe(a)} and {describe(b)}")
+
+    missing = []
+    for entry in staff:
+        for sheet in ("Champs Info", "Food handler cards"):
+            if sheet not in matched[id(entry)]:
+                missing.append(f"{describe(entry)} is not on {sheet}")
+    for entry in pay_scale:
+        if "Staff" not in matched[id(entry)]:
+            missing.append(f"{describe(entry)} is not on Staff")
+
+    sections = [
+        ("Possible duplicates", duplicates),
+        ("Spelled differently on different sheets", spellings),
+        ("On Staff but also in Departures (rehire?)", sorted(set(departed))),
+        ("Missing from a sheet", missing),
+    ]
+    blocks = [
+        {
+            "type": "header",
+            "text": {"type": "plain_text", "text": "Roster Check"}
+        }
+    ]
+    for title, lines in sections:
+        if lines:
+            new_line = "\n"
+            blocks.append(
+                {
+                    "type": "section",
+                    # Slack caps a text block at 3000 characters
+                    "text": {"type": "mrkdwn", "text": f"*{title}*\n{new_line.join(lines)}"[:3000]}
+                }
+            )
+    if len(blocks) == 1:
+        logger.info("Roster check found nothing to report")
+        return
+
+    payload = {
+        "text": "Roster Check",
+        "blocks": blocks
+    }
+
+    r = requests.post(webhook_url, json=payload)
+    if r.status_code != 200:
+        raise ValueError(f"Request to Slack returned an error {r.status_code}\n"
+                         f"The response is: {r.text}")
+
+
+if __name__ == "__main__":
+    main()
@@ -6,6 +6,7 @@ import gspread
 import matplotlib.pyplot as plt
 import os
 import pandas as pd
+import quota
 import quopri
 import re
 import requests
@@ -133,9 +134,9 @@ def check_cater():
 def check_cem():
     """Look at gmail to find CEM email and report findings"""
     # Google Sheet work
-    sh = gc.open_by_key(creds.cem_id)
-    daily = sh.worksheet("Daily")
-    cem_data = daily.get_all_records()[-30:]
+    sh = quota.call(gc.open_by_key, creds.cem_id)
+    daily = quota.call(sh.worksheet, "Daily")
+    cem_data = quota.call(daily.get_all_records)[-30:]
     columns = ["Date", ]
     columns.extend(categories)
     data = pd.DataFrame(cem_data, columns=columns)
@@ -289,12 +290,12 @@ def post_symbol_goal():
     day (20% of same day last year."""
     logger.info("Starting post_symbol_goal")
     # Connect to Google Sheets
-    sh = gc.open_by_key(creds.symbol_id)
-    sheet = sh.worksheet("Daily Goals")
+    sh = quota.call(gc.open_by_key, creds.symbol_id)
+    sheet = quota.call(sh.worksheet, "Daily Goals")
     current_date = datetime.date.today()
-    cell = sheet.find(current_date.strftime("%Y-%m-%d"))
+    cell = quota.call(sheet.find, current_date.strftime("%Y-%m-%d"))
     logger.info(f"Date cell: {cell}")
-    goal = sheet.cell(cell.row, cell.col + 6).value
+    goal = quota.call(sheet.cell, cell.row, cell.col + 6).value
     logger.info(f"Goal: {goal}")
     content = f"*Today's Symbol Goal:* {goal}"
     payload = {"text": content}
@@ -0,0 +1,460 @@
+# Everything that talks to Google Sheets from the bot goes through this file.
+# gspread is a synchronous library, so calling it straight from an async Slack handler freezes the whole
+# event loop until Google answers. call() hands the gspread work to a small pool of threads and gives
+# the handler something it can await instead. Every call also goes through quota.py so the bot and the cron
+# scripts share the Sheets quota politely.
+import asyncio
+import creds
+import dates
+import functools
+import gspread
+import json
+import os
+import quota
+import time
+
+from bisect import bisect_left, bisect_right
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from google.auth.exceptions import RefreshError
+from loguru import logger
+
+# Keep this small. More threads just means more concurrent requests against the same Sheets quota.
+MAX_WORKERS = 4
+
+gc = gspread.service_account(filename=creds.gspread)
+_executor = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix="sheets")
+
+# Opened Spreadsheet and Worksheet objects. Opening either one costs a metadata request, so we do it
+# once and hang on to them. Worksheets are keyed by (spreadsheet key, tab name or index).
+_spreadsheets = {}
+_worksheets = {}
+# Calls handed to call() that haven't finished yet (waiting on the pool, on quota, or on Google)
+_in_flight = 0
+
+# Reference tabs that are read on almost every command but only change a few times a week. Their values
+# are cached for this many seconds. Anything not listed here uses DEFAULT_TTL when read with get_values().
+CACHE_TTL = {
+    (creds.staff_id, "Staff"): 15 * 60,
+    (creds.staff_id, "Leaders"): 60 * 60,
+    (creds.staff_id, "Shift Notes"): 10 * 60,
+    (creds.waste_id, "Goals"): 60 * 60,
+    (creds.cater_id, "Sheet2"): 60 * 60,
+}
+DEFAULT_TTL = 5 * 60
+
+# Form submissions are appended in the background instead of while the user waits. Rows for the same tab
+# are sent together in one request once FLUSH_ROWS are waiting or FLUSH_SECONDS have passed. Until then they
+# live in JOURNAL_FILE so a crash or restart doesn't lose anything.
+FLUSH_ROWS = 20
+FLUSH_SECONDS = 5
+JOURNAL_FILE = "sheets_journal.jsonl"
+# A batch that has failed this many flushes in a row (or fails in a way retrying won't fix, like a deleted tab)
+# is moved to DEAD_LETTER_FILE so it stops using up quota, and whoever is registered with set_failure_handler()
+# hears about it.
+MAX_ATTEMPTS = 5
+DEAD_LETTER_FILE = "sheets_dead_letter.jsonl"
+PERMANENT_STATUSES = (400, 403, 404)
+
+# (key, name) -> (time fetched, values from get_all_values)
+_cache = {}
+# (key, name) -> task that is currently fetching that tab, so simultaneous misses share one request
+_refreshing = {}
+# (key, name) -> bumped on every invalidation so a fetch that started before a write can't put old values back
+_generations = {}
+# (key, name, value_input_option) -> rows waiting to be appended
+_pending = {}
+# (key, name, value_input_option) -> flushes in a row that batch has failed
+_attempts = {}
+_flush_lock = asyncio.Lock()
+# held while the journal file is written, so a rewrite can't drop a row that is being appended
+_journal_lock = asyncio.Lock()
+_flush_now = None
+_flusher = None
+# Something get_values() can ask for a tab's values when Google can't be reached and nothing is cached yet,
+# and something that gets a copy of every tab get_values() reads so it has them for then. mirror.py plugs
+# itself in here.
+_fallback = None
+_fallback_save = None
+# async func(name, rows, error) called when queued rows are given up on. app.py plugs in a DM to PJ.
+_failure_handler = None
+
+
+def _is_auth_error(e):
+    if isinstance(e, RefreshError):
+        return True
+    return isinstance(e, gspread.exceptions.APIError) and e.response.status_code == 401
+
+
+async def call(func, *args, **kwargs):
+    """Run a blocking gspread call on the Sheets thread pool and wait for the result without
+    blocking the event loop. Pass idempotent=False for appends, inserts and deletes (see quota.call).
+
+    Example usage:
+    sheet = await sheets.worksheet(creds.staff_id, "Staff")
+    values = await sheets.call(sheet.get_all_values)
+    """
+    global _in_flight
+    loop = asyncio.get_running_loop()
+    _in_flight += 1
+    try:
+        return await loop.run_in_executor(_executor, functools.partial(quota.call, func, *args, **kwargs))
+    except Exception as e:
+        if _is_auth_error(e):
+            # The handles we're holding belong to a client whose credentials are no good anymore.
+            # The caller still gets the error, but the next request starts with a fresh client.
+            logger.warning(f"Google auth failed, reconnecting: {e}")
+            reconnect()
+        raise
+    finally:
+        _in_flight -= 1
+
+
+def queue_depth():
+    """How many Sheets calls from this process are queued or running, and how many of those are held up
+    waiting on the shared quota."""
+    return {"in_flight": _in_flight, "waiting_for_quota": quota.limiter.queue_depth}
+
+
+async def spreadsheet(key):
+    """Return the Spreadsheet for key, opening it on first use."""
+    sh = _spreadsheets.get(key)
+    if sh is None:
+        sh = await call(gc.open_by_key, key)
+        _spreadsheets[key] = sh
+    return sh
+
+
+async def worksheet(key, name):
+    """Return a Worksheet from the spreadsheet with the given key. name can be the tab title or
+    its index (the same thing you would pass to get_worksheet)."""
+    ws = _worksheets.get((key, name))
+    if ws is None:
+        sh = await spreadsheet(key)
+        if isinstance(name, int):
+            ws = await call(sh.get_worksheet, name)
+        else:
+            ws = await call(sh.worksheet, name)
+        _worksheets[(key, name)] = ws
+    return ws
+
+
+def invalidate(key=None, name=None):
+    """Forget opened handles so they are reopened on next use. With no arguments everything goes.
+    With just a key, that spreadsheet and all of its tabs go. With both, only that tab goes."""
+    if key is None:
+        _spreadsheets.clear()
+        _worksheets.clear()
+        return
+    if name is None:
+        _spreadsheets.pop(key, None)
+        for handle_key in [k for k in _worksheets if k[0] == key]:
+            del _worksheets[handle_key]
+    else:
+        _worksheets.pop((key, name), None)
+
+
+def reconnect():
+    """Build a new gspread client and drop every handle that was opened with the old one."""
+    global gc
+    gc = gspread.service_account(filename=creds.gspread)
+    invalidate()
+
+
+async def get_values(key, name):
+    """Return every value on a tab (like get_all_values), read through the cache. The list that comes
+    back is shared with other callers, so don't modify it."""
+    entry = _cache.get((key, name))
+    ttl = CACHE_TTL.get((key, name), DEFAULT_TTL)
+    if entry and time.monotonic() - entry[0] < ttl:
+        return entry[1]
+    task = _refreshing.get((key, name))
+    if task is None:
+        task = asyncio.ensure_future(_refresh(key, name))
+        _refreshing[(key, name)] = task
+        task.add_done_callback(functools.partial(_refresh_done, (key, name)))
+    # shield so one impatient caller being cancelled doesn't cancel the fetch for everyone else
+    return await asyncio.shield(task)
+
+
+async def _refresh(key, name):
+    generation = _generations.get((key, name), 0)
+    try:
+        ws = await worksheet(key, name)
+        values = await call(ws.get_all_values)
+    except Exception as e:
+        stale = _cache.get((key, name))
+        if stale is None:
+            values = _fallback(key, name) if _fallback else None
+            if values is None:
+                raise
+            logger.warning(f"Reading {name} failed, serving values from the fallback: {e}")
+            return values
+        # A slightly old staff list is much better than a broken command
+        logger.warning(f"Refreshing {name} failed, serving cached values: {e}")
+        return stale[1]
+    if _generations.get((key, name), 0) == generation:
+        _cache[(key, name)] = (time.monotonic(), values)
+    if _fallback_save:
+        try:
+            _fallback_save(key, name, values)
+        except Exception:
+            logger.exception(f"Saving a fallback copy of {name} failed\n")
+    return values
+
+
+def _refresh_done(cache_key, task):
+    # Only clear the slot if an invalidation hasn't already replaced this task with a newer one
+    if _refreshing.get(cache_key) is task:
+        del _refreshing[cache_key]
+
+
+def set_fallback(func, save=None):
+    """Register func(key, name) to supply a tab's values when Google can't be reached. It should return
+    None for tabs it doesn't know about. save(key, name, values), if given, is called with every tab
+    get_values() reads from Google."""
+    global _fallback, _fallback_save
+    _fallback = func
+    _fallback_save = save
+
+
+def set_failure_handler(func):
+    """Register async func(name, rows, error) to be told when queued rows are moved to the dead letter file"""
+    global _failure_handler
+    _failure_handler = func
+
+
+def invalidate_values(key, name):
+    """Throw away the cached values for a tab. Call this right after the bot writes to a cached tab so
+    the next read sees the change."""
+    _cache.pop((key, name), None)
+    _refreshing.pop((key, name), None)
+    _generations[(key, name)] = _generations.get((key, name), 0) + 1
+
+
+async def patch_row(key, name, locator, values, formulas=None, locator_col=1):
+    """Update cells on every row whose locator_col cell equals locator, using a single batch_update.
+
+    values maps column numbers to the new values. formulas does the same for formulas written as templates,
+    where {row} is replaced with the row being patched. Columns that sit next to each other are sent as one
+    range. Returns the list of rows that were patched.
+
+    Example usage:
+    await sheets.patch_row(creds.sales_id, "Sales", "2024-05-01", {5: 300, 6: 9000}, {8: "=F{row}/E{row}"})
+    """
+    ws = await worksheet(key, name)
+    column = await call(ws.col_values, locator_col)
+    rows = [i + 1 for i, cell in enumerate(column) if cell == locator]
+    if not rows:
+        return rows
+    data = []
+    for row in rows:
+        cells = dict(values)
+        for col, template in (formulas or {}).items():
+            cells[col] = template.format(row=row)
+        # group neighboring columns so E:M goes out as one range instead of nine
+        cols = sorted(cells)
+        start = cols[0]
+        for i, col in enumerate(cols):
+            if i + 1 == len(cols) or cols[i + 1] != col + 1:
+                data.append(
+                    {
+                        "range": f"{gspread.utils.rowcol_to_a1(row, start)}:{gspread.utils.rowcol_to_a1(row, col)}",
+                        "values": [[cells[c] for c in range(start, col + 1)]]
+                    }
+                )
+                if i + 1 < len(cols):
+                    start = cols[i + 1]
+    await call(ws.batch_update, data, value_input_option="USER_ENTERED")
+    return rows
+
+
+def text_key(text):
+    """Sort key that matches how Sheets sorts a text column A to Z: case doesn't matter and blanks go last"""
+    text = text.strip()
+    return (text == "", text.lower())
+
+
+def date_key(text):
+    """Sort key for a column of dates. Blank or unreadable cells go last."""
+    parsed = dates.parse(text)
+    return (False, parsed) if parsed else (True, datetime.max)
+
+
+def _sort_keys(values, col, sort_key, header_rows):
+    return [sort_key(row[col - 1] if len(row) >= col else "") for row in values[header_rows:]]
+
+
+async def sorted_insert(key, name, row, col=1, sort_key=text_key, header_rows=0, value_input_option="USER_ENTERED"):
+    """Insert row into a tab that is kept sorted on column col, right where it belongs. This is one insert
+    instead of an append plus a sort of the whole tab. The position comes from a binary search of the cached
+    values, so the tab is read at most once. Returns the row number the new row went to.
+
+    Example usage:
+    await sheets.sorted_insert(creds.card_id, "Food handler cards", row, col=3, sort_key=sheets.date_key,
+                               header_rows=1)
+    """
+    keys = _sort_keys(await get_values(key, name), col, sort_key, header_rows)
+    row_num = header_rows + bisect_right(keys, sort_key(row[col - 1])) + 1
+    ws = await worksheet(key, name)
+    try:
+        await call(ws.insert_row, row, index=row_num, value_input_option=value_input_option, idempotent=False)
+    finally:
+        invalidate_values(key, name)
+    return row_num
+
+
+async def sorted_remove(key, name, value, col=1, sort_key=text_key, header_rows=0):
+    """Delete the row whose column col holds value from a tab that is kept sorted on that column. Returns
+    the row number that was deleted, or None if value wasn't found."""
+    for _ in range(2):
+        values = await get_values(key, name)
+        keys = _sort_keys(values, col, sort_key, header_rows)
+        target = sort_key(value)
+        # Binary search first, but fall back to looking at every row in case somebody unsorted the tab by hand
+        start = bisect_left(keys, target)
+        candidates = list(range(start, len(keys))) + list(range(start))
+        position = next((i for i in candidates if values[header_rows + i][col - 1:col] == [value]), None)
+        if position is None:
+            return None
+        row_num = header_rows + position + 1
+        ws = await worksheet(key, name)
+        # The cached copy could be a few minutes old. Make sure we are about to delete the right row.
+        cell = await call(ws.cell, row_num, col)
+        if cell.value == value:
+            try:
+                await call(ws.delete_rows, row_num, idempotent=False)
+            finally:
+                invalidate_values(key, name)
+            return row_num
+        invalidate_values(key, name)
+    return None
+
+
+def _journal_line(key, name, row, value_input_option):
+    return json.dumps({"key": key, "name": name, "row": row, "value_input_option": value_input_option}) + "\n"
+
+
+def _append_file(file_name, text):
+    with open(file_name, "a") as f:
+        f.write(text)
+        f.flush()
+        os.fsync(f.fileno())
+
+
+async def append_later(key, name, row, value_input_option="RAW"):
+    """Queue a row to be appended to a tab. The row is written to the journal first (on a worker thread, fsync
+    can be slow), so once this returns it will make it to the sheet eventually, even across a restart, or end
+    up in the dead letter file if the sheet won't take it."""
+    async with _journal_lock:
+        await asyncio.to_thread(_append_file, JOURNAL_FILE, _journal_line(key, name, row, value_input_option))
+        _pending.setdefault((key, name, value_input_option), []).append(row)
+    start_flusher()
+    if sum(len(rows) for rows in _pending.values()) >= FLUSH_ROWS:
+        _flush_now.set()
+
+
+def _is_permanent(e):
+    if isinstance(e, (gspread.exceptions.WorksheetNotFound, gspread.exceptions.SpreadsheetNotFound)):
+        return True
+    return isinstance(e, gspread.exceptions.APIError) and e.response.status_code in PERMANENT_STATUSES
+
+
+async def _dead_letter(batch_key, rows, error):
+    batch_sheet, batch_name, value_input_option = batch_key
+    logger.error(f"Giving up on {len(rows)} queued row(s) for {batch_name}, moved to {DEAD_LETTER_FILE}: {error}")
+    text = "".join(_journal_line(batch_sheet, batch_name, row, value_input_option) for row in rows)
+    await asyncio.to_thread(_append_file, DEAD_LETTER_FILE, text)
+    if _failure_handler:
+        try:
+            await _failure_handler(batch_name, rows, error)
+        except Exception:
+            logger.exception("Reporting dead lettered rows failed\n")
+
+
+async def flush(key=None, name=None):
+    """Append everything that is queued (or only what is queued for one tab) right now. Rows that fail to
+    send stay queued for the next attempt, up to MAX_ATTEMPTS flushes."""
+    async with _flush_lock:
+        batches = {k: rows for k, rows in _pending.items() if key is None or k[:2] == (key, name)}
+        for batch_key in batches:
+            del _pending[batch_key]
+        failed = {}
+        for batch_key, rows in batches.items():
+            batch_sheet, batch_name, value_input_option = batch_key
+            try:
+                ws = await worksheet(batch_sheet, batch_name)
+                await call(ws.append_rows, rows, value_input_option=value_input_option, idempotent=False)
+                logger.info(f"Appended {len(rows)} queued row(s) to {batch_name}")
+                _attempts.pop(batch_key, None)
+            except Exception as e:
+                _attempts[batch_key] = _attempts.get(batch_key, 0) + 1
+                if _is_permanent(e) or _attempts[batch_key] >= MAX_ATTEMPTS:
+                    _attempts.pop(batch_key, None)
+                    await _dead_letter(batch_key, rows, e)
+                    continue
+                logger.exception(f"Appending queued rows to {batch_name} failed. They will be retried.\n")
+                failed[batch_key] = rows
+        for batch_key, rows in failed.items():
+            # keep the original order ahead of anything that was queued while we were busy
+            _pending[batch_key] = rows + _pending.get(batch_key, [])
+        if batches:
+            await _rewrite_journal()
+
+
+def _write_journal(text):
+    tmp_file = JOURNAL_FILE + ".tmp"
+    with open(tmp_file, "w") as f:
+        f.write(text)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_file, JOURNAL_FILE)
+
+
+async def _rewrite_journal():
+    async with _journal_lock:
+        text = "".join(_journal_line(key, name, row, value_input_option)
+                       for (key, name, value_input_option), rows in _pending.items() for row in rows)
+        await asyncio.to_thread(_write_journal, text)
+
+
+def _load_journal():
+    """Pick up rows that were queued but never sent before the last shutdown."""
+    if not os.path.exists(JOURNAL_FILE):
+        return
+    count = 0
+    with open(JOURNAL_FILE) as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                # a half written line from a crash mid-write
+                continue
+            batch_key = (entry['key'], entry['name'], entry['value_input_option'])
+            _pending.setdefault(batch_key, []).append(entry['row'])
+            count += 1
+    if count:
+        logger.info(f"Loaded {count} unsent row(s) from {JOURNAL_FILE}")
+
+
+async def _flush_loop():
+    while True:
+        try:
+            await asyncio.wait_for(_flush_now.wait(), FLUSH_SECONDS)
+        except asyncio.TimeoutError:
+            pass
+        _flush_now.clear()
+        if _pending:
+            await flush()
+
+
+def start_flusher():
+    """Start the background task that sends queued rows. Safe to call more than once, but it needs a
+    running event loop."""
+    global _flusher, _flush_now
+    if _flusher is None or _flusher.done():
+        _flush_now = asyncio.Event()
+        _flusher = asyncio.get_running_loop().create_task(_flush_loop())
+
+
+_load_journal()
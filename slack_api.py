@@ -0,0 +1,115 @@
+# Every Slack Web API call the bot makes goes through ScheduledWebClient.
+# Slack rate limits each method separately (the "tiers"), chat.postMessage is limited to about one message a
+# second per channel, and a 429 comes back with a Retry-After telling us how long to back off. The client
+# paces calls per method (and per channel for posting), allowing short bursts, and when Slack says to wait,
+# everything waits.
+import asyncio
+import time
+
+from loguru import logger
+from slack_sdk.errors import SlackApiError
+from slack_sdk.web.async_client import AsyncWebClient
+
+# Calls per minute for each tier. https://api.slack.com/docs/rate-limits
+TIER_1 = 1
+TIER_2 = 20
+TIER_3 = 50
+TIER_4 = 100
+METHOD_TIERS = {
+    "chat.delete": TIER_3,
+    "chat.getPermalink": TIER_4,
+    "chat.postEphemeral": TIER_4,
+    "chat.update": TIER_3,
+    "conversations.history": TIER_3,
+    "conversations.info": TIER_3,
+    "conversations.replies": TIER_3,
+    "files.getUploadURLExternal": TIER_4,
+    "files.completeUploadExternal": TIER_4,
+    "reactions.add": TIER_3,
+    "users.info": TIER_4,
+    "users.list": TIER_2,
+    "views.open": TIER_4,
+    "views.publish": TIER_4,
+    "views.push": TIER_4,
+    "views.update": TIER_4,
+}
+# Anything not listed above
+DEFAULT_TIER = TIER_3
+# Methods limited per channel instead of per method
+PER_CHANNEL = {"chat.postMessage": 60}
+# Slack lets short bursts over the per minute rate through. Each method (or channel) can make this share of its
+# per minute budget back to back before calls start getting spaced out.
+BURST_SHARE = 0.1
+# These need a trigger_id, which Slack only honors for 3 seconds after the click. They are made one per click,
+# so they go straight out and only a 429 holds them back.
+UNPACED = {"views.open", "views.push"}
+MAX_RETRIES = 3
+
+
+class Pacer:
+    """Token bucket for one per minute budget. A full bucket lets a burst through at once, after that calls
+    are spaced out. Each caller takes its token up front (going into debt if there isn't one) and then sleeps
+    off its share of the debt, so callers go out in order without holding a lock while they wait."""
+    def __init__(self, per_minute, burst=None):
+        self.rate = per_minute / 60
+        self.burst = burst or max(1, int(per_minute * BURST_SHARE))
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+
+    async def wait(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        self.tokens -= 1
+        if self.tokens < 0:
+            try:
+                await asyncio.sleep(-self.tokens / self.rate)
+            except asyncio.CancelledError:
+                # give the token back, this call never happened
+                self.tokens += 1
+                raise
+
+
+def _channel(kwargs):
+    for key in ("json", "data", "params"):
+        channel = (kwargs.get(key) or {}).get("channel")
+        if channel:
+            return channel
+    return None
+
+
+class ScheduledWebClient(AsyncWebClient):
+    """An AsyncWebClient that paces calls by rate tier, per channel for chat.postMessage, and backs everything
+    off after a 429. Pass it to AsyncApp as client= and every handler's client uses it."""
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._pacers = {}
+        self._paused_until = 0
+
+    def _pacer(self, api_method, channel):
+        if api_method in PER_CHANNEL:
+            key = (api_method, channel)
+            per_minute = PER_CHANNEL[api_method]
+        else:
+            key = api_method
+            per_minute = METHOD_TIERS.get(api_method, DEFAULT_TIER)
+        if key not in self._pacers:
+            self._pacers[key] = Pacer(per_minute)
+        return self._pacers[key]
+
+    async def api_call(self, api_method, **kwargs):
+        pacer = None if api_method in UNPACED else self._pacer(api_method, _channel(kwargs))
+        for attempt in range(MAX_RETRIES + 1):
+            if pacer:
+                await pacer.wait()
+            # A 429 on any method holds back every call
+            while self._paused_until > time.monotonic():
+                await asyncio.sleep(self._paused_until - time.monotonic())
+            try:
+                return await super().api_call(api_method, **kwargs)
+            except SlackApiError as e:
+                if e.response.status_code != 429 or attempt == MAX_RETRIES:
+                    raise
+                retry_after = int(e.response.headers.get("Retry-After", 1))
+                logger.warning(f"Slack rate limited {api_method}, holding all calls for {retry_after}s")
+                self._paused_until = max(self._paused_until, time.monotonic() + retry_after)
@@ -0,0 +1,212 @@
+# One ID per team member, no matter how their name gets typed.
+# The sick, tardy and discipline logs only have names on them, and the same person shows up as "Jon Smith",
+# "jon smith" and "Jonathan Smith". Every spelling we see is saved here as an alias of a team member, and the
+# commands that write to the logs stamp the team member's ID (TM00042) on the row. Lookups like /find can then
+# match on the ID instead of fuzzy matching every row.
+# This file is the only record of which IDs have been handed out. If it goes missing, it is rebuilt from the IDs
+# already stamped on the sheets before any new ones are given out (see rebuild()).
+import asyncio
+import creds
+import mirror
+import names
+import os
+import re
+import sheets
+import sqlite3
+
+from fuzzywuzzy import fuzz
+from loguru import logger
+
+# Next to this file rather than wherever the bot was started from, since the IDs in it are already on the sheets
+TEAM_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "team.db")
+# Mirrored logs and the column their name is in. Every spelling on them is registered by learn_from_mirror().
+LOGS = {"sick": 1, "tardy": 0, "discipline": 1}
+# Other tabs the bot stamps IDs on, as (key, tab, name column, ID column)
+STAMPED_TABS = [(creds.departure_id, "Departures", 1, 5), (creds.staff_id, "Staff", 0, 1)]
+TM_ID = re.compile(r"TM(\d+)")
+
+db = sqlite3.connect(TEAM_FILE)
+_rebuild_lock = asyncio.Lock()
+# True until the registry has members in it (either from before or from rebuild())
+_needs_rebuild = True
+# Every alias spelling, for fuzzy lookups. _alias_members[i] is the member that _index.names[i] belongs to.
+_index = names.NameIndex()
+_alias_members = []
+# table -> [mirror version, last row] already registered
+_learned = {}
+
+
+def _create_tables():
+    with db:
+        db.execute("CREATE TABLE IF NOT EXISTS members "
+                   "(member_id INTEGER PRIMARY KEY, name TEXT NOT NULL, departed TEXT NOT NULL DEFAULT '')")
+        # spelling is the name exactly as it was typed (that's what the logs can be searched on) and alias is
+        # the same name run through names.normalize
+        db.execute("CREATE TABLE IF NOT EXISTS aliases "
+                   "(spelling TEXT PRIMARY KEY COLLATE NOCASE, alias TEXT NOT NULL, member_id INTEGER NOT NULL)")
+        db.execute("CREATE INDEX IF NOT EXISTS aliases_alias ON aliases (alias)")
+        db.execute("CREATE INDEX IF NOT EXISTS aliases_member_id ON aliases (member_id)")
+
+
+def _load_index():
+    global _index, _alias_members
+    aliases = db.execute("SELECT spelling, member_id FROM aliases ORDER BY rowid").fetchall()
+    _index = names.NameIndex(spelling for spelling, _ in aliases)
+    _alias_members = [member_id for _, member_id in aliases]
+
+
+def format_id(member_id):
+    return f"TM{member_id:05d}"
+
+
+def _member_id(tm_id):
+    return int(tm_id[2:])
+
+
+def _add_spelling(spelling, alias, member_id):
+    with db:
+        db.execute("INSERT INTO aliases (spelling, alias, member_id) VALUES (?, ?, ?)", [spelling, alias, member_id])
+    _index.add(spelling)
+    _alias_members.append(member_id)
+
+
+def resolve(name):
+    """The ID for a name, registering a new team member if we've never seen this name before. Only spellings
+    that normalize to the same name count as the same person. Close ones ("Mario" and "Maria") can be two
+    people, so they get their own IDs and only /find matches them loosely. Returns "" while the registry is waiting to be rebuilt, so an ID that's already on the sheets can't be
+    handed out again. Those rows are still found by name."""
+    spelling = name.strip()
+    alias = names.normalize(spelling)
+    if not alias:
+        return ""
+    row = db.execute("SELECT member_id FROM aliases WHERE spelling = ?", [spelling]).fetchone()
+    if row:
+        return format_id(row[0])
+    if _needs_rebuild:
+        logger.warning(f"Team registry hasn't been rebuilt yet, not stamping an ID for {spelling}")
+        return ""
+    row = db.execute("SELECT member_id FROM aliases WHERE alias = ?", [alias]).fetchone()
+    if row:
+        # Somebody we know, typed a little differently ("O'Neil" vs "ONeil")
+        member_id = row[0]
+    else:
+        with db:
+            member_id = db.execute("INSERT INTO members (name) VALUES (?)", [spelling]).lastrowid
+    _add_spelling(spelling, alias, member_id)
+    return format_id(member_id)
+
+
+def _stamped(values, name_col, id_col):
+    """(member_id, spelling) for every row with an ID stamped on it"""
+    for row in values:
+        if len(row) <= max(name_col, id_col):
+            continue
+        match = TM_ID.fullmatch(row[id_col].strip())
+        if match and names.normalize(row[name_col]):
+            yield int(match.group(1)), row[name_col].strip()
+
+
+async def rebuild():
+    """Read every ID already stamped on the sheets back into an empty registry. Does nothing once the registry
+    has members. If the sheets can't be read, it stays empty (and resolve() keeps returning "") until the next
+    call manages it."""
+    global _needs_rebuild
+    async with _rebuild_lock:
+        if not _needs_rebuild:
+            return
+        try:
+            sources = []
+            for table_name, name_col in LOGS.items():
+                await mirror.sync(table_name)
+                sources.append(([values for _, values in mirror.rows(table_name)], name_col,
+                                mirror.TABLES[table_name].columns["tm_id"]))
+            for key, tab, name_col, id_col in STAMPED_TABS:
+                sources.append((await sheets.get_values(key, tab), name_col, id_col))
+        except Exception:
+            logger.exception("Couldn't read the sheets to rebuild the team registry, trying again later")
+            return
+        count = 0
+        with db:
+            for values, name_col, id_col in sources:
+                for member_id, spelling in _stamped(values, name_col, id_col):
+                    count += db.execute("INSERT OR IGNORE INTO members (member_id, name) VALUES (?, ?)",
+                                        [member_id, spelling]).rowcount
+                    db.execute("INSERT OR IGNORE INTO aliases (spelling, alias, member_id) VALUES (?, ?, ?)",
+                               [spelling, names.normalize(spelling), member_id])
+        _load_index()
+        _needs_rebuild = False
+        logger.info(f"Rebuilt the team registry with {count} team member(s) from the sheets")
+
+
+def name(tm_id):
+    row = db.execute("SELECT name FROM members WHERE member_id = ?", [_member_id(tm_id)]).fetchone()
+    return row[0] if row else ""
+
+
+def spellings(tm_id):
+    """Every spelling of this team member's name we've seen"""
+    return [row[0] for row in db.execute("SELECT spelling FROM aliases WHERE member_id = ?", [_member_id(tm_id)])]
+
+
+def set_departed(tm_id, departed):
+    """Record the date someone left, or pass "" when they are rehired"""
+    if not tm_id:
+        return
+    with db:
+        db.execute("UPDATE members SET departed = ? WHERE member_id = ?", [departed, _member_id(tm_id)])
+
+
+def find_all(name, cutoff):
+    """IDs of every team member with a spelling that scores above cutoff (token_sort_ratio) against name, best
+    match first. An exact spelling we've seen before always comes first."""
+    alias = names.normalize(name)
+    scores = {}
+    for position in _index.candidates(alias):
+        score = fuzz.token_sort_ratio(alias, _index.normalized[position])
+        member_id = _alias_members[position]
+        if score > cutoff and score > scores.get(member_id, -1):
+            scores[member_id] = score
+    row = db.execute("SELECT member_id FROM aliases WHERE alias = ?", [alias]).fetchone()
+    if row:
+        scores[row[0]] = 101
+    return [format_id(member_id) for member_id in sorted(scores, key=scores.get, reverse=True)]
+
+
+def find(name, cutoff):
+    """The ID of the team member whose name is closest to name, or None if nobody scores above cutoff"""
+    found = find_all(name, cutoff)
+    return found[0] if found else None
+
+
+def learn_from_mirror():
+    """Register every name on the mirrored logs. Only rows added since the last call are looked at, unless
+    the mirror says something higher up changed. Nothing is learned until the registry has been rebuilt."""
+    if _needs_rebuild:
+        return
+    for table_name, name_col in LOGS.items():
+        current, rewritten_at = mirror.version(table_name)
+        version, last_row = _learned.get(table_name, (None, 1))
+        if current == version:
+            continue
+        if version is None or rewritten_at > version:
+            # start over, skipping the header row
+            last_row = 1
+        for row, values in mirror.rows_after(table_name, last_row):
+            if len(values) > name_col and values[name_col].strip():
+                resolve(values[name_col])
+            last_row = row
+        _learned[table_name] = (current, last_row)
+
+
+def log_rows(table_name, tm_ids):
+    """Rows from a mirrored log for a list of team members, in sheet order. Rows stamped with one of the IDs
+    are an exact match. Older rows from before IDs were stamped are matched on any spelling of their names
+    we've seen."""
+    found = dict(mirror.rows(table_name, tm_id=tm_ids))
+    found.update(mirror.rows(table_name, name=[spelling for tm_id in tm_ids for spelling in spellings(tm_id)]))
+    return [found[row] for row in sorted(found)]
+
+
+_create_tables()
+_load_index()
+_needs_rebuild = db.execute("SELECT 1 FROM members LIMIT 1").fetchone() is None
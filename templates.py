@@ -0,0 +1,69 @@
+# Block Kit templates.
+# Most of a modal is the same every time it opens: titles, labels, inputs, fixed option lists. A Template is made
+# once (at import) from the whole view with Slot markers where the values change, like today's date or the list
+# of names. render() fills the slots in by copying only the dicts and lists on the way down to each slot, and
+# everything else is shared between renders. So a rendered view must not be modified in place, but Slack never
+# sees the difference.
+
+
+class Slot:
+    def __init__(self, name):
+        self.name = name
+
+    def __repr__(self):
+        return f"Slot({self.name!r})"
+
+
+def _children(node):
+    if isinstance(node, dict):
+        return node.items()
+    if isinstance(node, list):
+        return enumerate(node)
+    return ()
+
+
+class Template:
+    def __init__(self, view):
+        self.view = view
+        # slot name -> paths (tuples of keys and indexes) from the top of the view to each place it's used
+        self.slots = {}
+        self._find(view, ())
+
+    def _find(self, node, path):
+        if isinstance(node, Slot):
+            self.slots.setdefault(node.name, []).append(path)
+            return
+        for key, child in _children(node):
+            self._find(child, path + (key,))
+
+    def render(self, **values):
+        """The view with every slot filled in. Each slot needs a value, and only slots can be given one.
+
+        Example usage:
+        view = modals.SICK.render(names=templates.options(staff))
+        """
+        missing = self.slots.keys() - values.keys()
+        unknown = values.keys() - self.slots.keys()
+        if missing or unknown:
+            raise TypeError(f"Template needs {sorted(self.slots)}, got {sorted(values)}")
+        view = _copy(self.view)
+        # path -> the copy already made for it, so containers shared by two slots are only copied once
+        copies = {(): view}
+        for name, paths in self.slots.items():
+            for path in paths:
+                node = view
+                for depth in range(1, len(path)):
+                    if path[:depth] not in copies:
+                        copies[path[:depth]] = node[path[depth - 1]] = _copy(node[path[depth - 1]])
+                    node = copies[path[:depth]]
+                node[path[-1]] = values[name]
+        return view
+
+
+def _copy(node):
+    return dict(node) if isinstance(node, dict) else list(node)
+
+
+def options(values):
+    """static_select options for a list of strings, using each one as both the text and the value"""
+    return [{"text": {"type": "plain_text", "text": value}, "value": value} for value in values]
@@ -1,5 +1,6 @@
 import creds
 import gspread
+import quota
 import requests
 import sys
 
@@ -10,7 +11,7 @@ logger.add("waste.log", rotation="1 week")
 
 # Connect to Google Sheets
 gc = gspread.service_account(filename=creds.gspread)
-spreadsheet = gc.open_by_key(creds.waste_id)
+spreadsheet = quota.call(gc.open_by_key, creds.waste_id)
 
 RED_CIRCLE = ":red_circle:"
 GREEN_CIRCLE = ":large_green_circle:"
@@ -25,10 +26,10 @@ def get_emoji(weight, goal):
 
 
 now_today = datetime.today().strftime("%Y-%m-%d")
-sheet = spreadsheet.worksheet("Data")
+sheet = quota.call(spreadsheet.worksheet, "Data")
 num_rows = sheet.row_count
-goal_sheet = spreadsheet.worksheet("Goals")
-goals = goal_sheet.get_all_values()
+goal_sheet = quota.call(spreadsheet.worksheet, "Goals")
+goals = quota.call(goal_sheet.get_all_values)
 goal_list = []
 weekly_goal_list = []
 for row in goals[1:]:
@@ -39,7 +40,7 @@ for row in goals[1:]:
 def weekly():
     now = datetime.today()
     then = now - timedelta(days=7)
-    values = sheet.get(f"A{num_rows - 30}:J{num_rows}")
+    values = quota.call(sheet.get, f"A{num_rows - 30}:J{num_rows}")
     filets = spicy = nuggets = strips = g_filets = g_nuggets = b_filets = gb_filets = sb_filets = 0
     for row in values:
         if datetime.strptime(row[0], "%Y-%m-%d %H:%M:%S") > then:
@@ -156,7 +157,7 @@ def weekly():
 
 def daily():
     logger.info(f"Daily Range: A{num_rows - 10}:J{num_rows}")
-    values = sheet.get(f"A{num_rows - 10}:J{num_rows}")
+    values = quota.call(sheet.get, f"A{num_rows - 10}:J{num_rows}")
     filets = spicy = nuggets = strips = g_filets = g_nuggets = b_filets = gb_filets = sb_filets = 0
     for row in values:
         if row[0][:10] == now_today: